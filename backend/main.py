@@ -8,39 +8,113 @@ This is the main FastAPI application that provides:
 - CORS support for frontend integration
 
 Run with: uvicorn main:app --reload --host 0.0.0.0 --port 8000
+Multiple workers: WEB_CONCURRENCY=4 python main.py
+Channel-sharded workers (behind a channel-hashing load balancer):
+    WORKER_COUNT=2 WORKER_ID=0 PORT=8000 python main.py
+    WORKER_COUNT=2 WORKER_ID=1 PORT=8001 python main.py
 """
 
 import asyncio
-import json
-import uuid
-from datetime import datetime
-from typing import Dict, List
+import itertools
+import logging
+import logging.handlers
+import queue
+import secrets
+import time
+import zlib
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 import sys
 import os
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
+import orjson
 import uvicorn
 
-# Add parent directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
 
-from models.message import Message, MessageCreate, MessageResponse, ChatHistory, User, UserCreate, UserLogin, Group, GroupCreate, GroupUpdate, ProfileUpdate
+# Use libuv's event loop even when started by an external runner
+if uvloop is not None:
+    uvloop.install()
+
+# Add parent directory to Python path (once, even if imported by several workers)
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+from models.message import ChatMsg, TypingStart, TypingStop, InboundMessage, Message, MessageCreate, MessageResponse, ChatHistory, User, UserCreate, UserLogin, Group, GroupCreate, GroupUpdate, ProfileUpdate
 from services.chat_service import chat_service
 from services.user_service import user_service
-from services.auth_service import auth_service
+from services.auth_service import auth_service, USERNAME_TAKEN, PHONE_TAKEN
 from services.group_service import group_service
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chat_redis.subscriber import subscribe_to_pattern
+
+import msgspec
+
+
+# Log through a queue so the event loop never blocks on stdout;
+# the listener thread does the actual writes
+logger = logging.getLogger("chat")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+
 
-from chat_redis.subscriber import subscribe_to_channel
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan - start background tasks and clean them up on shutdown.
+    """
+    log_listener.start()
+    
+    logger.info("🚀 Real-Time Chat API starting up...")
+    logger.info("📡 WebSocket endpoint: ws://localhost:8000/ws/chat")
+    logger.info("🌐 API documentation: http://localhost:8000/docs")
+    
+    # Chat history stored in the old per-channel lists moves into streams
+    migrated = await chat_service.migrate_legacy_history()
+    if migrated:
+        logger.info("Migrated legacy chat history for %d channels", migrated)
+    
+    app.state.background_tasks = [
+        # Background cleanup task
+        asyncio.create_task(cleanup_task()),
+        # Batched pub/sub publisher
+        asyncio.create_task(publish_task()),
+        # Pub/sub relay to local WebSocket connections
+        asyncio.create_task(relay_task()),
+    ]
+    app.state.log_listener = log_listener
+    
+    yield
+    
+    logger.info("🛑 Real-Time Chat API shutting down...")
+    
+    for task in app.state.background_tasks:
+        task.cancel()
+    await asyncio.gather(*app.state.background_tasks, return_exceptions=True)
+    
+    app.state.log_listener.stop()
 
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Real-Time Chat API",
     description="FastAPI backend for real-time chat application with Redis integration",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Configure CORS for frontend integration
@@ -52,6 +126,131 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Worker processes serving the app; with more than one, channel membership
+# must be merged from Redis since each worker only sees its own sockets
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+# Channel sharding across separately started workers: each channel is owned
+# by worker crc32(channel) % WORKER_COUNT, and a worker only accepts
+# WebSockets for channels it owns. Disabled unless WORKER_ID is set.
+WORKER_COUNT = int(os.environ.get("WORKER_COUNT", 1))
+WORKER_ID = int(os.environ["WORKER_ID"]) if "WORKER_ID" in os.environ else None
+
+# WebSocket close code for a connection that reached a worker not owning its channel
+WRONG_WORKER_CLOSE_CODE = 4001
+
+# Outbound frames buffered per connection before it is treated as too slow
+SEND_QUEUE_SIZE = 256
+
+# Relayed events between yields to the event loop, so connection writers
+# get to run during a burst; well under SEND_QUEUE_SIZE
+RELAY_YIELD_EVERY = 64
+
+# Seconds an /api/users/online response is served from cache
+ONLINE_USERS_CACHE_TTL = 1.0
+
+# Seconds chat history and channel list responses are served from cache
+HISTORY_CACHE_TTL = 0.5
+CHANNELS_CACHE_TTL = 0.5
+
+# Most channels a per-channel response cache holds, and history limits
+# cached per channel; past these, expired entries are swept out first
+RESPONSE_CACHE_MAX_CHANNELS = 1024
+HISTORY_CACHE_MAX_LIMITS = 8
+
+# Most events sent to Redis in one publish pipeline
+PUBLISH_MAX_BATCH = 128
+
+# Seconds the publisher waits for more events before flushing a lone one
+PUBLISH_MAX_WAIT = 0.002
+
+# Bounds for the adaptive cleanup interval, in seconds
+CLEANUP_MIN_INTERVAL = 30
+CLEANUP_MAX_INTERVAL = 300
+
+# Seconds between safety sweeps when key-expiry notifications drive cleanup
+CLEANUP_SAFETY_INTERVAL = 3600
+
+# Redis publishes the names of expired keys in db 0 here (notify-keyspace-events Ex)
+EXPIRED_KEYS_CHANNEL = "__keyevent@0__:expired"
+
+# Repeated typing_start events within this window are not re-broadcast
+TYPING_REBROADCAST_INTERVAL = 2.0
+
+
+# Pre-built JSON for presence events; only the variable fields are filled in.
+# Event timestamps are integer milliseconds since the Unix epoch (UTC).
+USER_JOINED_TEMPLATE = '{{"type":"user_joined","username":{username},"channel":{channel},"timestamp":{timestamp}}}'
+USER_LEFT_TEMPLATE = '{{"type":"user_left","username":{username},"channel":{channel},"timestamp":{timestamp}}}'
+TYPING_STATUS_TEMPLATE = (
+    '{{"type":"typing_status","username":{username},"channel":{channel},'
+    '"is_typing":{is_typing},"timestamp":{timestamp}}}'
+)
+
+
+def _json_str(value: str) -> str:
+    """Encode a string as a JSON string literal (quoted and escaped)."""
+    return orjson.dumps(value).decode()
+
+
+def now_ms() -> int:
+    """Return the current time as integer milliseconds since the Unix epoch."""
+    return time.time_ns() // 1_000_000
+
+
+def _iso_from_ms(timestamp_ms: int) -> str:
+    """
+    Format epoch milliseconds as a UTC ISO-8601 string, in the same
+    format as datetime.now(timezone.utc).isoformat().
+    """
+    second, millis = divmod(timestamp_ms, 1000)
+    return f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))}.{millis * 1000:06d}+00:00"
+
+
+def _make_room(cache: dict, max_entries: int, is_expired) -> None:
+    """
+    Make room for one more entry in a response cache. Once the cache holds
+    max_entries, drop its expired entries, and if none were expired, the
+    oldest one. Cache keys come straight from request URLs, so without
+    this a client could grow them without bound.
+    
+    Args:
+        cache: Cache dict to trim
+        max_entries: Most entries the cache may hold
+        is_expired: Called with an entry's value, True if it is stale
+    """
+    if len(cache) < max_entries:
+        return
+    for key in [key for key, entry in cache.items() if is_expired(entry)]:
+        del cache[key]
+    if len(cache) >= max_entries:
+        del cache[next(iter(cache))]
+
+
+@dataclass(slots=True)
+class Connection:
+    """
+    State for one WebSocket connection.
+    """
+    connection_id: str
+    websocket: WebSocket
+    username: str
+    channel: str
+    # When the connection joined its channel (epoch ms)
+    connected_at: int
+    # Outbound frames and the task draining them onto the socket
+    send_queue: asyncio.Queue
+    writer: Optional[asyncio.Task] = None
+
+
+def channel_owner(channel: str) -> int:
+    """
+    Return the worker that owns a channel when channel sharding is enabled.
+    
+    Uses CRC32 rather than hash(), which is randomized per process.
+    """
+    return zlib.crc32(channel.encode()) % WORKER_COUNT
+
 
 class ConnectionManager:
     """
@@ -63,11 +262,35 @@ class ConnectionManager:
     - User session management
     """
     
+    __slots__ = (
+        "connections",
+        "channel_connections",
+        "channel_users",
+        "_typing_state",
+        "_typing_last_sent",
+        "disconnect_count",
+        "_next_id",
+        "_id_prefix",
+        "_close_tasks",
+    )
+    
     def __init__(self):
-        # Store active connections: {websocket_id: websocket}
-        self.active_connections: Dict[str, WebSocket] = {}
-        # Store user info: {websocket_id: {"username": str, "channel": str}}
-        self.connection_info: Dict[str, Dict[str, str]] = {}
+        # Store active connections: {websocket_id: Connection}
+        self.connections: Dict[str, Connection] = {}
+        # Index connections by channel: {channel: {websocket_id: Connection}}
+        self.channel_connections: Dict[str, Dict[str, Connection]] = defaultdict(dict)
+        # Connected users per channel with their connection count: {channel: {username: refcount}}
+        self.channel_users: Dict[str, Dict[str, int]] = defaultdict(dict)
+        # Last typing state broadcast: {(username, channel): is_typing}
+        self._typing_state: Dict[Tuple[str, str], bool] = {}
+        self._typing_last_sent: Dict[Tuple[str, str], float] = {}
+        # Disconnects since the last cleanup run (drives cleanup_task's interval)
+        self.disconnect_count = 0
+        # Connection IDs are a per-process counter behind a random worker prefix
+        self._next_id = itertools.count(1)
+        self._id_prefix = secrets.token_hex(2)
+        # Pending closes of dropped slow connections (kept so they aren't garbage collected)
+        self._close_tasks = set()
     
     async def connect(self, websocket: WebSocket, username: str, channel: str = "general") -> str:
         """
@@ -83,23 +306,33 @@ class ConnectionManager:
         """
         await websocket.accept()
         
-        # Generate unique connection ID
-        connection_id = str(uuid.uuid4())
+        # Generate unique connection ID (no urandom read per connection)
+        connection_id = f"{self._id_prefix}-{next(self._next_id):x}"
         
         # Store connection
-        self.active_connections[connection_id] = websocket
-        self.connection_info[connection_id] = {
-            "username": username,
-            "channel": channel
-        }
+        conn = Connection(
+            connection_id=connection_id,
+            websocket=websocket,
+            username=username,
+            channel=channel,
+            connected_at=now_ms(),
+            send_queue=asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        )
+        conn.writer = asyncio.create_task(self._writer(conn))
+        self.connections[connection_id] = conn
+        self.channel_connections[channel][connection_id] = conn
+        users = self.channel_users[channel]
+        users[username] = users.get(username, 0) + 1
+        if users[username] == 1:
+            _online_cache.pop(channel, None)
         
         # Add user to channel
         await user_service.add_user_to_channel(username, channel, connection_id)
         
-        print(f"User {username} connected to channel {channel} (ID: {connection_id})")
+        logger.info("User %s connected to channel %s (ID: %s)", username, channel, connection_id)
         
         # Notify other users about new connection
-        await self.broadcast_user_joined(username, channel, connection_id)
+        await self.broadcast_user_joined(username, channel)
         
         return connection_id
     
@@ -110,107 +343,247 @@ class ConnectionManager:
         Args:
             connection_id: Connection ID to remove
         """
-        if connection_id in self.active_connections:
-            # Get user info before removing
-            user_info = self.connection_info.get(connection_id, {})
-            username = user_info.get("username", "Unknown")
-            channel = user_info.get("channel", "general")
+        conn = self.connections.pop(connection_id, None)
+        if conn is not None:
+            username = conn.username
+            channel = conn.channel
             
-            # Remove from active connections
-            del self.active_connections[connection_id]
-            del self.connection_info[connection_id]
+            self.disconnect_count += 1
+            if conn.writer is not None and conn.writer is not asyncio.current_task():
+                conn.writer.cancel()
+            
+            channel_connections = self.channel_connections.get(channel)
+            if channel_connections is not None:
+                channel_connections.pop(connection_id, None)
+                if not channel_connections:
+                    del self.channel_connections[channel]
+            
+            users = self.channel_users.get(channel)
+            if users is not None and username in users:
+                users[username] -= 1
+                if users[username] == 0:
+                    del users[username]
+                    _online_cache.pop(channel, None)
+                    if not users:
+                        del self.channel_users[channel]
+            
+            self._typing_state.pop((username, channel), None)
+            self._typing_last_sent.pop((username, channel), None)
             
             # Remove user from channel
             await user_service.remove_user_from_channel(username, channel, connection_id)
             
-            print(f"User {username} disconnected from channel {channel}")
+            logger.info("User %s disconnected from channel %s", username, channel)
             
             # Notify other users about disconnection
-            await self.broadcast_user_left(username, channel, connection_id)
+            await self.broadcast_user_left(username, channel)
+    
+    async def _writer(self, conn: Connection):
+        """
+        Drain a connection's send queue onto its WebSocket.
+        
+        Args:
+            conn: Connection whose queue to drain
+        """
+        send_queue = conn.send_queue
+        websocket = conn.websocket
+        try:
+            while True:
+                message = await send_queue.get()
+                await websocket.send_bytes(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Error sending message to %s: %s", conn.connection_id, e)
+            # Remove broken connection (disconnect won't cancel the calling writer)
+            await self.disconnect(conn.connection_id)
+    
+    def _enqueue(self, message: bytes, conn: Connection) -> bool:
+        """
+        Queue a frame for a connection without waiting on the network.
+        
+        Returns:
+            bool: False if the connection's send queue is full
+        """
+        try:
+            conn.send_queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+    
+    async def _enqueue_after_turn(self, message: bytes, conns: List[Connection]):
+        """
+        Retry queueing a frame for connections whose send queue was full,
+        after giving their writers a turn on the event loop. A burst can
+        fill the queue of a healthy client before its writer ever runs, so
+        only a queue that is still full afterwards marks a slow client,
+        which is dropped.
+        
+        Args:
+            message: UTF-8 encoded JSON message
+            conns: Connections whose queue was full
+        """
+        await asyncio.sleep(0)
+        for conn in conns:
+            # Skip connections that went away while we yielded
+            if conn.connection_id in self.connections and not self._enqueue(message, conn):
+                logger.error("Send queue full for %s, dropping slow connection", conn.connection_id)
+                await self._drop_slow(conn)
+    
+    async def _drop_slow(self, conn: Connection):
+        """
+        Disconnect a client whose send queue is full and close its WebSocket,
+        which also ends the endpoint's receive loop for it.
+        
+        Args:
+            conn: Connection to drop
+        """
+        await self.disconnect(conn.connection_id)
+        
+        # Close in the background so a stalled client can't hold up the caller
+        task = asyncio.create_task(self._close(conn.websocket))
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_tasks.discard)
+    
+    async def _close(self, websocket: WebSocket):
+        """
+        Close a dropped client's WebSocket with 1008 (policy violation).
+        
+        Args:
+            websocket: WebSocket to close
+        """
+        try:
+            await websocket.close(code=1008)
+        except Exception as e:
+            logger.debug("Error closing dropped connection: %s", e)
     
-    async def send_personal_message(self, message: str, connection_id: str):
+    async def send_personal_message(self, message: bytes, connection_id: str):
         """
         Send message to a specific WebSocket connection.
         
         Args:
-            message: JSON message string
+            message: UTF-8 encoded JSON message
             connection_id: Target connection ID
         """
-        if connection_id in self.active_connections:
-            websocket = self.active_connections[connection_id]
-            try:
-                await websocket.send_text(message)
-            except Exception as e:
-                print(f"Error sending message to {connection_id}: {e}")
-                # Remove broken connection
-                await self.disconnect(connection_id)
-    
-    async def broadcast_to_channel(self, message: str, channel: str, exclude_connection: str = None):
+        conn = self.connections.get(connection_id)
+        if conn is not None and not self._enqueue(message, conn):
+            await self._enqueue_after_turn(message, [conn])
+    
+    async def broadcast_to_channel(self, message: bytes, channel: str, exclude_connection: str = None):
         """
         Broadcast message to all users in a specific channel.
         
+        The payload is encoded once by the caller and queued for every
+        recipient; each connection's writer task sends it as a binary
+        frame, so a slow client never holds up the broadcast.
+        
         Args:
-            message: JSON message string
+            message: UTF-8 encoded JSON message
             channel: Target channel name
             exclude_connection: Connection ID to exclude from broadcast
         """
-        disconnected_connections = []
+        # Only walk connections subscribed to the target channel
+        channel_connections = self.channel_connections.get(channel)
+        if not channel_connections:
+            return
         
-        for connection_id, websocket in self.active_connections.items():
-            # Check if connection is in the target channel
-            user_info = self.connection_info.get(connection_id, {})
-            if user_info.get("channel") == channel and connection_id != exclude_connection:
-                try:
-                    await websocket.send_text(message)
-                except Exception as e:
-                    print(f"Error broadcasting to {connection_id}: {e}")
-                    disconnected_connections.append(connection_id)
+        full_connections = []
+        for connection_id, conn in channel_connections.items():
+            if connection_id != exclude_connection and not self._enqueue(message, conn):
+                full_connections.append(conn)
+        
+        # Drop clients that still can't keep up once their writers have run
+        if full_connections:
+            await self._enqueue_after_turn(message, full_connections)
+    
+    def should_broadcast_typing(self, username: str, channel: str, is_typing: bool) -> bool:
+        """
+        Debounce typing indicators per user and channel.
         
-        # Clean up broken connections
-        for connection_id in disconnected_connections:
-            await self.disconnect(connection_id)
+        Returns:
+            bool: True if the state changed or the last broadcast is stale
+        """
+        key = (username, channel)
+        now = asyncio.get_running_loop().time()
+        
+        if (self._typing_state.get(key) == is_typing
+                and now - self._typing_last_sent.get(key, 0.0) < TYPING_REBROADCAST_INTERVAL):
+            return False
+        
+        self._typing_state[key] = is_typing
+        self._typing_last_sent[key] = now
+        return True
     
-    async def broadcast_user_joined(self, username: str, channel: str, exclude_connection: str = None):
+    async def broadcast_user_joined(self, username: str, channel: str):
         """
         Broadcast user joined notification to channel.
+        
+        Goes through Redis pub/sub like chat messages, so users on every
+        worker see it (clients ignore events about themselves).
         """
-        message = {
-            "type": "user_joined",
-            "username": username,
-            "channel": channel,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        await self.broadcast_to_channel(json.dumps(message), channel, exclude_connection)
+        message = USER_JOINED_TEMPLATE.format(
+            username=_json_str(username),
+            channel=_json_str(channel),
+            timestamp=now_ms()
+        ).encode()
+        publish_queue.put_nowait((channel, message, None))
     
-    async def broadcast_user_left(self, username: str, channel: str, exclude_connection: str = None):
+    async def broadcast_user_left(self, username: str, channel: str):
         """
         Broadcast user left notification to channel.
+        
+        Goes through Redis pub/sub like chat messages, so users on every
+        worker see it (clients ignore events about themselves).
         """
-        message = {
-            "type": "user_left",
-            "username": username,
-            "channel": channel,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        await self.broadcast_to_channel(json.dumps(message), channel, exclude_connection)
+        message = USER_LEFT_TEMPLATE.format(
+            username=_json_str(username),
+            channel=_json_str(channel),
+            timestamp=now_ms()
+        ).encode()
+        publish_queue.put_nowait((channel, message, None))
     
-    async def broadcast_typing_status(self, username: str, channel: str, is_typing: bool, exclude_connection: str = None):
+    async def broadcast_typing_status(self, username: str, channel: str, is_typing: bool):
         """
         Broadcast typing status to channel.
+        
+        Goes through Redis pub/sub like chat messages, so users on every
+        worker see it (clients ignore events about themselves).
         """
-        message = {
-            "type": "typing_status",
-            "username": username,
-            "channel": channel,
-            "is_typing": is_typing,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        await self.broadcast_to_channel(json.dumps(message), channel, exclude_connection)
+        message = TYPING_STATUS_TEMPLATE.format(
+            username=_json_str(username),
+            channel=_json_str(channel),
+            is_typing="true" if is_typing else "false",
+            timestamp=now_ms()
+        ).encode()
+        publish_queue.put_nowait((channel, message, None))
 
 
 # Create global connection manager
 manager = ConnectionManager()
 
+# Decodes and validates inbound WebSocket JSON frames in one pass
+DECODER = msgspec.json.Decoder(InboundMessage)
+
+# Frames without a "type" are chat messages; decoding ChatMsg on its own
+# accepts a missing tag but still rejects any other tag
+CHAT_DECODER = msgspec.json.Decoder(ChatMsg)
+
+# Serialized online-users responses: {channel: (created_at, json_bytes)}
+# Expired entries are swept out once the cache fills up (see _make_room)
+_online_cache: Dict[str, Tuple[float, bytes]] = {}
+
+# Serialized chat history responses: {channel: {limit: (created_at, json_bytes)}}
+# A channel's entries are dropped as soon as a new event is relayed for it,
+# and expired ones are swept out once the cache fills up (see _make_room)
+_history_cache: Dict[str, Dict[int, Tuple[float, bytes]]] = {}
+
+# Serialized channel list response: (created_at, json_bytes)
+_channels_cache: List[Tuple[float, bytes]] = []
+
+# Encoded events waiting to be published to Redis pub/sub:
+# (channel, payload, message to save to history first or None)
+publish_queue: "asyncio.Queue[Tuple[str, bytes, Optional[Message]]]" = asyncio.Queue()
+
 
 # WebSocket endpoint for real-time chat
 @app.websocket("/ws/chat")
@@ -227,137 +600,172 @@ async def websocket_endpoint(websocket: WebSocket, username: str, channel: str =
         - typing_start: User started typing
         - typing_stop: User stopped typing
     """
+    # With channel sharding, send clients for other channels to their owner
+    if WORKER_ID is not None:
+        owner = channel_owner(channel)
+        if owner != WORKER_ID:
+            await websocket.accept()
+            await websocket.close(code=WRONG_WORKER_CLOSE_CODE, reason=f"channel is served by worker {owner}")
+            return
+    
     connection_id = await manager.connect(websocket, username, channel)
     
     try:
         while True:
-            # Receive message from WebSocket
-            data = await websocket.receive_text()
+            # Receive a frame from the WebSocket; binary frames are handed to
+            # the decoder as raw bytes, skipping text decoding
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            data = frame.get("bytes")
+            if data is None:
+                data = frame.get("text", "")
             
-            try:
-                message_data = json.loads(data)
-                message_type = message_data.get("type", "message")
-                
-                if message_type == "message":
-                    # Handle regular chat message
-                    await handle_chat_message(message_data, connection_id, channel)
-                
-                elif message_type == "typing_start":
-                    # Handle typing indicator
+            # Only JSON objects go through the decoder; a cheap first-character
+            # check routes plain text without raising DecodeError
+            msg = None
+            if data.lstrip()[:1] in (b"{", "{"):
+                try:
+                    msg = DECODER.decode(data)
+                except msgspec.ValidationError:
+                    try:
+                        msg = CHAT_DECODER.decode(data)
+                    except msgspec.ValidationError:
+                        # Unknown "type" or wrongly typed fields
+                        continue
+                except msgspec.DecodeError:
+                    pass
+            
+            if msg is None:
+                # Handle plain text messages (backward compatibility)
+                if isinstance(data, bytes):
+                    data = data.decode("utf-8", "replace")
+                msg = ChatMsg(content=data, sender=username)
+            
+            if isinstance(msg, ChatMsg):
+                # Handle regular chat message
+                await handle_chat_message(msg, connection_id, channel)
+            
+            elif isinstance(msg, TypingStart):
+                # Handle typing indicator (skip unchanged repeats)
+                if manager.should_broadcast_typing(username, channel, True):
                     await user_service.set_user_typing(username, channel, True)
-                    await manager.broadcast_typing_status(username, channel, True, connection_id)
-                
-                elif message_type == "typing_stop":
-                    # Handle stop typing
+                    await manager.broadcast_typing_status(username, channel, True)
+            
+            elif isinstance(msg, TypingStop):
+                # Handle stop typing (skip unchanged repeats)
+                if manager.should_broadcast_typing(username, channel, False):
                     await user_service.set_user_typing(username, channel, False)
-                    await manager.broadcast_typing_status(username, channel, False, connection_id)
-                
-            except json.JSONDecodeError:
-                # Handle plain text messages (backward compatibility)
-                message_data = {
-                    "type": "message",
-                    "content": data,
-                    "sender": username,
-                    "channel": channel
-                }
-                await handle_chat_message(message_data, connection_id, channel)
+                    await manager.broadcast_typing_status(username, channel, False)
                 
     except WebSocketDisconnect:
         await manager.disconnect(connection_id)
     except Exception as e:
-        print(f"WebSocket error for {username}: {e}")
+        logger.error("WebSocket error for %s: %s", username, e)
         await manager.disconnect(connection_id)
 
 
-async def handle_chat_message(message_data: dict, connection_id: str, channel: str):
+async def handle_chat_message(msg: ChatMsg, connection_id: str, channel: str):
     """
     Handle incoming chat message from WebSocket.
     
     Args:
-        message_data: Message data dictionary
+        msg: Decoded chat message frame (field types already validated)
         connection_id: WebSocket connection ID
         channel: Channel name
     """
     try:
-        # Create message object
-        message_create = MessageCreate(
-            sender=message_data.get("sender", "Anonymous"),
-            content=message_data.get("content", ""),
-            channel=channel,
-            message_type=message_data.get("message_type", "text")
-        )
-        
-        # Save message to Redis
-        message = await chat_service.save_message(message_create)
-        
-        # Publish message to Redis pub/sub for broadcasting
-        await chat_service.publish_message(message)
-        
-        # Broadcast to WebSocket connections in the same channel
-        broadcast_message = {
-            "type": "message",
-            "sender": message.sender,
-            "content": message.content,
-            "channel": message.channel,
-            "message_type": message.message_type,
-            "timestamp": message.timestamp.isoformat(),
-            "message_id": message.message_id
+        fields = {
+            "sender": msg.sender,
+            "content": msg.content,
+            "channel": channel,
+            "message_type": msg.message_type
         }
         
-        await manager.broadcast_to_channel(
-            json.dumps(broadcast_message), 
-            channel, 
-            exclude_connection=connection_id
-        )
+        # publish_task saves and publishes it in a batched pipeline;
+        # relay_task then delivers the bytes to WebSockets on every worker
+        message = chat_service.build_message(fields)
+        publish_queue.put_nowait((channel, chat_service.encode_message_event(message), message))
         
     except Exception as e:
-        print(f"Error handling chat message: {e}")
+        logger.error("Error handling chat message: %s", e)
 
 
 # REST API Endpoints
 
-@app.get("/", response_model=dict)
+# Static health-check body, serialized once at import
+_ROOT_RESPONSE_BODY = orjson.dumps({
+    "message": "Real-Time Chat API is running!",
+    "version": "1.0.0",
+    "endpoints": {
+        "websocket": "/ws/chat?username=YourName&channel=general",
+        "chat_history": "/api/chat/history/{channel}",
+        "online_users": "/api/users/online/{channel}",
+        "channels": "/api/chat/channels"
+    }
+})
+
+
+@app.get("/", response_class=ORJSONResponse)
 async def root():
     """
     Root endpoint - API health check.
     """
-    return {
-        "message": "Real-Time Chat API is running!",
-        "version": "1.0.0",
-        "endpoints": {
-            "websocket": "/ws/chat?username=YourName&channel=general",
-            "chat_history": "/api/chat/history/{channel}",
-            "online_users": "/api/users/online/{channel}",
-            "channels": "/api/chat/channels"
-        }
-    }
+    return Response(_ROOT_RESPONSE_BODY, media_type="application/json")
 
 
-@app.get("/api/chat/history/{channel}", response_model=ChatHistory)
-async def get_chat_history(channel: str, limit: int = 50):
+@app.get("/api/chat/history/{channel}", response_class=ORJSONResponse)
+async def get_chat_history(channel: str, limit: int = 50, stream: bool = False):
     """
     Get chat history for a specific channel.
     
     Args:
         channel: Channel name
         limit: Maximum number of messages to retrieve (default: 50)
+        stream: Stream messages as NDJSON, one per line, instead of
+            building the whole ChatHistory object (for large limits)
     
     Returns:
         ChatHistory: Chat history with messages and metadata
     """
     try:
+        if stream:
+            async def ndjson_lines():
+                async for message_json in chat_service.iter_chat_history(channel, limit):
+                    yield message_json + b"\n"
+            
+            return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+        
+        # Serve recent results from cache to absorb client polling
+        now = time.monotonic()
+        cached = _history_cache.get(channel, {}).get(limit)
+        if cached and now - cached[0] < HISTORY_CACHE_TTL:
+            return Response(cached[1], media_type="application/json")
+        
         messages = await chat_service.get_chat_history(channel, limit)
         
-        return ChatHistory(
+        # Encode a ChatHistory directly; msgspec serializes the Structs natively
+        payload = msgspec.json.encode(ChatHistory(
             messages=messages,
             total_count=len(messages),
             channel=channel
-        )
+        ))
+        entries = _history_cache.get(channel)
+        if entries is None:
+            _make_room(
+                _history_cache, RESPONSE_CACHE_MAX_CHANNELS,
+                lambda cached: all(now - created_at >= HISTORY_CACHE_TTL for created_at, _ in cached.values())
+            )
+            entries = _history_cache[channel] = {}
+        elif limit not in entries:
+            _make_room(entries, HISTORY_CACHE_MAX_LIMITS, lambda cached: now - cached[0] >= HISTORY_CACHE_TTL)
+        entries[limit] = (now, payload)
+        return Response(payload, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving chat history: {str(e)}")
 
 
-@app.get("/api/users/online/{channel}")
+@app.get("/api/users/online/{channel}", response_class=ORJSONResponse)
 async def get_online_users(channel: str):
     """
     Get list of online users in a channel.
@@ -369,17 +777,45 @@ async def get_online_users(channel: str):
         dict: List of online users with their status
     """
     try:
-        online_users = await user_service.get_online_users(channel)
-        return {
+        # Serve recent results from cache to absorb client polling
+        now = time.monotonic()
+        cached = _online_cache.get(channel)
+        if cached and now - cached[0] < ONLINE_USERS_CACHE_TTL:
+            return Response(cached[1], media_type="application/json")
+        
+        # Users connected to this worker are known without asking Redis;
+        # other workers' users only show up in the Redis channel set.
+        # With channel sharding the owning worker holds every user.
+        if WORKER_ID is not None:
+            other_workers = channel_owner(channel) != WORKER_ID
+        else:
+            other_workers = WORKERS > 1
+        # last_seen is each user's latest join time: the presence score
+        # from Redis, or the connect time of a local connection
+        join_times: Dict[str, int] = {}
+        if other_workers:
+            join_times = await user_service.get_channel_join_times(channel)
+        for conn in manager.channel_connections.get(channel, {}).values():
+            if conn.connected_at > join_times.get(conn.username, 0):
+                join_times[conn.username] = conn.connected_at
+        
+        payload = orjson.dumps({
             "channel": channel,
-            "online_users": [user.model_dump() for user in online_users],
-            "count": len(online_users)
-        }
+            "online_users": [
+                {"username": username, "status": "online", "last_seen": _iso_from_ms(join_times[username])}
+                for username in sorted(join_times)
+            ],
+            "count": len(join_times)
+        })
+        if channel not in _online_cache:
+            _make_room(_online_cache, RESPONSE_CACHE_MAX_CHANNELS, lambda cached: now - cached[0] >= ONLINE_USERS_CACHE_TTL)
+        _online_cache[channel] = (now, payload)
+        return Response(payload, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving online users: {str(e)}")
 
 
-@app.get("/api/chat/channels")
+@app.get("/api/chat/channels", response_class=ORJSONResponse)
 async def get_active_channels():
     """
     Get list of active chat channels.
@@ -388,11 +824,18 @@ async def get_active_channels():
         dict: List of active channels
     """
     try:
+        # Serve recent results from cache to absorb client polling
+        now = time.monotonic()
+        if _channels_cache and now - _channels_cache[0][0] < CHANNELS_CACHE_TTL:
+            return Response(_channels_cache[0][1], media_type="application/json")
+        
         channels = await chat_service.get_active_channels()
-        return {
+        payload = orjson.dumps({
             "channels": channels,
             "count": len(channels)
-        }
+        })
+        _channels_cache[:] = [(now, payload)]
+        return Response(payload, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving channels: {str(e)}")
 
@@ -409,32 +852,13 @@ async def send_message(message_data: MessageCreate):
         MessageResponse: Success response with message details
     """
     try:
-        # Save message
-        message = await chat_service.save_message(message_data)
-        
-        # Publish message
-        await chat_service.publish_message(message)
-        
-        # Broadcast to WebSocket connections
-        broadcast_message = {
-            "type": "message",
-            "sender": message.sender,
-            "content": message.content,
-            "channel": message.channel,
-            "message_type": message.message_type,
-            "timestamp": message.timestamp.isoformat(),
-            "message_id": message.message_id
-        }
-        
-        await manager.broadcast_to_channel(
-            json.dumps(broadcast_message), 
-            message.channel
-        )
+        # Save and publish in one pipeline
+        message = await chat_service.save_and_publish(message_data)
         
         return MessageResponse(
             success=True,
             message="Message sent successfully",
-            data=message.model_dump()
+            data=msgspec.to_builtins(message)
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error sending message: {str(e)}")
@@ -461,13 +885,11 @@ async def delete_message(message_id: str, channel: str):
                 "type": "message_deleted",
                 "message_id": message_id,
                 "channel": channel,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": now_ms()
             }
             
-            await manager.broadcast_to_channel(
-                json.dumps(delete_message), 
-                channel
-            )
+            # Goes through Redis like chat messages so every worker sees it
+            publish_queue.put_nowait((channel, orjson.dumps(delete_message), None))
             
             return MessageResponse(
                 success=True,
@@ -496,8 +918,11 @@ async def register_user(user_data: UserCreate):
         dict: Registration result with user data or error
     """
     try:
+        # Register user; the username and phone checks happen inside it
+        user, reason = await auth_service.register_user(user_data)
+        
         # Check if username exists
-        if await auth_service.username_exists(user_data.username):
+        if reason == USERNAME_TAKEN:
             suggestions = await auth_service.suggest_usernames(user_data.username)
             return {
                 "success": False,
@@ -506,15 +931,12 @@ async def register_user(user_data: UserCreate):
             }
         
         # Check if phone exists
-        if await auth_service.phone_exists(user_data.phone_number):
+        if reason == PHONE_TAKEN:
             return {
                 "success": False,
                 "message": "Phone number already registered"
             }
         
-        # Register user
-        user = await auth_service.register_user(user_data)
-        
         if user:
             return {
                 "success": True,
@@ -612,17 +1034,8 @@ async def get_all_users():
         dict: List of all users
     """
     try:
-        users = await auth_service.get_all_users()
-        return {
-            "users": [{
-                "username": user.username,
-                "display_name": user.display_name,
-                "avatar_url": user.avatar_url,
-                "created_at": user.created_at.isoformat(),
-                "is_active": user.is_active
-            } for user in users],
-            "count": len(users)
-        }
+        payload = await auth_service.get_all_users_json()
+        return Response(payload, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving users: {str(e)}")
 
@@ -836,51 +1249,103 @@ async def get_user_groups(username: str):
         raise HTTPException(status_code=500, detail=f"Error retrieving user groups: {str(e)}")
 
 
-# Background task for cleanup
-async def cleanup_task():
+# Background task for batched publishing
+async def publish_task():
     """
-    Background task to clean up expired user sessions and typing indicators.
-    Runs every 5 minutes.
+    Background task that publishes queued events to Redis pub/sub.
+    Up to PUBLISH_MAX_BATCH queued events go out in one pipeline.
     """
     while True:
+        events = [await publish_queue.get()]
+        
+        # Give concurrent handlers a moment to join a lone event's batch
+        if publish_queue.empty():
+            await asyncio.sleep(PUBLISH_MAX_WAIT)
+        
         try:
-            cleaned_count = await user_service.cleanup_expired_users()
-            if cleaned_count > 0:
-                print(f"Cleaned up {cleaned_count} expired user entries")
-        except Exception as e:
-            print(f"Error in cleanup task: {e}")
+            while len(events) < PUBLISH_MAX_BATCH:
+                events.append(publish_queue.get_nowait())
+        except asyncio.QueueEmpty:
+            pass
         
-        # Wait 5 minutes before next cleanup
-        await asyncio.sleep(300)
+        await chat_service.publish_batch(events)
 
 
-@app.on_event("startup")
-async def startup_event():
+# Background task for cross-worker delivery
+async def relay_task():
     """
-    Application startup event - initialize background tasks.
+    Background task that forwards chat messages published to Redis by
+    any worker to the WebSocket connections held by this worker.
+    The same subscription receives key-expiry events for channel cleanup.
     """
-    print("🚀 Real-Time Chat API starting up...")
-    print("📡 WebSocket endpoint: ws://localhost:8000/ws/chat")
-    print("🌐 API documentation: http://localhost:8000/docs")
-    
-    # Start background cleanup task
-    asyncio.create_task(cleanup_task())
+    expired_channel = EXPIRED_KEYS_CHANNEL.encode()
+    relayed = 0
+    while True:
+        try:
+            async for redis_channel, payload in subscribe_to_pattern("chat:*", EXPIRED_KEYS_CHANNEL):
+                # Queueing a frame never suspends, so let the connection
+                # writers drain their queues every so often during a burst
+                relayed += 1
+                if relayed % RELAY_YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
+                
+                if redis_channel == expired_channel:
+                    await chat_service.on_key_expired(payload.decode())
+                    continue
+                
+                # Redis channel is "chat:<channel_name>"
+                channel = redis_channel.decode().split(":", 1)[1]
+                # History may have changed, so cached responses for it are stale
+                _history_cache.pop(channel, None)
+                await manager.broadcast_to_channel(payload, channel)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Error in relay task: %s", e)
+            await asyncio.sleep(1)
 
 
-@app.on_event("shutdown")
-async def shutdown_event():
+# Background task for cleanup
+async def cleanup_task():
     """
-    Application shutdown event - cleanup resources.
+    Background task to prune stale channel presence and typing indicators.
+    
+    When Redis key-expiry notifications are available, relay_task handles
+    expirations as they happen and this only runs an hourly safety sweep.
+    Otherwise it runs every 5 minutes on a quiet server, and more often as
+    disconnects pile up (down to every 30 seconds).
     """
-    print("🛑 Real-Time Chat API shutting down...")
+    notifications = await user_service.enable_expiry_notifications()
+    while True:
+        try:
+            cleaned_count = await user_service.cleanup_expired_users()
+            if cleaned_count > 0:
+                logger.info("Cleaned up %d expired user entries", cleaned_count)
+        except Exception as e:
+            logger.error("Error in cleanup task: %s", e)
+        
+        recent_disconnects = manager.disconnect_count
+        manager.disconnect_count = 0
+        if notifications:
+            await asyncio.sleep(CLEANUP_SAFETY_INTERVAL)
+        else:
+            # Wait longer when little has churned since the last run
+            await asyncio.sleep(max(CLEANUP_MIN_INTERVAL, CLEANUP_MAX_INTERVAL - 10 * recent_disconnects))
 
 
 if __name__ == "__main__":
+    # Worker processes share messages through Redis pub/sub (see relay_task)
+    workers = WORKERS
+    
     # Run the application
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
+        port=int(os.environ.get("PORT", 8000)),
+        workers=workers,
+        reload=workers == 1,
+        log_level="info",
+        loop="uvloop" if uvloop is not None else "asyncio",
+        http="httptools",
+        ws="websockets"
     )
\ No newline at end of file
@@ -1,15 +1,18 @@
 """
 Message models for the Real-Time Chat Application.
 
-This module defines Pydantic models for:
-- Message structure validation
-- API request/response schemas
+This module defines:
+- msgspec Structs for data stored in Redis (messages, users, groups),
+  encoded and decoded with msgspec.json without Pydantic validation
+- Pydantic models for API request/response schemas, which FastAPI validates
 - WebSocket message formats
 """
 
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Union
+
+import msgspec
 
 
 class MessageCreate(BaseModel):
@@ -23,16 +26,17 @@ class MessageCreate(BaseModel):
     message_type: str = "text"  # text, image, audio
 
 
-class Message(BaseModel):
+class Message(msgspec.Struct, kw_only=True):
     """
     Complete message model with timestamp.
     Used for storing and retrieving messages from Redis.
+    The timestamp is integer milliseconds since the Unix epoch (UTC).
     """
     sender: str
     content: str
     channel: str
     message_type: str
-    timestamp: datetime
+    timestamp: int
     message_id: Optional[str] = None
 
 
@@ -45,7 +49,7 @@ class MessageResponse(BaseModel):
     data: Optional[dict] = None
 
 
-class ChatHistory(BaseModel):
+class ChatHistory(msgspec.Struct, kw_only=True):
     """
     Model for chat history response.
     """
@@ -64,7 +68,7 @@ class UserCreate(BaseModel):
     avatar_url: Optional[str] = None
 
 
-class User(BaseModel):
+class User(msgspec.Struct, kw_only=True):
     """
     Complete user model with all details.
     """
@@ -95,9 +99,12 @@ class GroupCreate(BaseModel):
     created_by: str
 
 
-class Group(BaseModel):
+class Group(msgspec.Struct, kw_only=True, omit_defaults=True):
     """
     Complete group model.
+    
+    members and admins live in their own Redis sets; the stored JSON
+    leaves them out.
     """
     id: str
     name: str
@@ -127,12 +134,41 @@ class ProfileUpdate(BaseModel):
     phone_number: Optional[str] = None
 
 
-class UserStatus(BaseModel):
+class UserStatus(msgspec.Struct, kw_only=True):
     """
     Model for user online status.
     """
     username: str
-    display_name: str
-    phone_number: str
     status: str  # online, offline, typing
-    last_seen: datetime
\ No newline at end of file
+    last_seen: datetime
+    # Profile fields aren't part of the presence data in Redis
+    display_name: Optional[str] = None
+    phone_number: Optional[str] = None
+
+
+# Inbound WebSocket frames, decoded in a single pass by msgspec.
+# The "type" field selects the struct; any "channel" sent by the client is
+# ignored because the connection is already bound to a channel.
+
+class ChatMsg(msgspec.Struct, tag_field="type", tag="message"):
+    """
+    Chat message sent by a client over WebSocket.
+    """
+    content: str = ""
+    sender: str = "Anonymous"
+    message_type: str = "text"  # text, image, audio
+
+
+class TypingStart(msgspec.Struct, tag_field="type", tag="typing_start"):
+    """
+    Client started typing.
+    """
+
+
+class TypingStop(msgspec.Struct, tag_field="type", tag="typing_stop"):
+    """
+    Client stopped typing.
+    """
+
+
+InboundMessage = Union[ChatMsg, TypingStart, TypingStop]
@@ -8,19 +8,36 @@ This service handles:
 - Phone number verification (placeholder)
 """
 
-import json
-import hashlib
+import time
 from datetime import datetime
-from typing import Optional, List
-import sys
-import os
+from typing import Dict, List, Optional, Tuple
 
-# Add parent directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import msgspec
+import orjson
 
-from chat_redis.redis_client import redis_client
+from chat_redis.redis_client import redis_client, redis_bytes_client
 from models.message import User, UserCreate, UserLogin, UserStatus
 
+# Reused msgspec codecs for stored users
+_ENCODER = msgspec.json.Encoder()
+_USER_DECODER = msgspec.json.Decoder(User)
+
+# Seconds the serialized user list is reused when no local change happened
+# (bounds staleness for changes made by other workers)
+USERS_JSON_CACHE_TTL = 5.0
+
+# Seconds a user read by get_user is served from memory; kept short since
+# writes made by other workers only show up once an entry expires
+USER_CACHE_TTL = 5.0
+
+# username -> (fetched_at, user) for get_user
+_USER_CACHE: Dict[str, Tuple[float, User]] = {}
+
+# Reasons register_user gives for a failed registration
+USERNAME_TAKEN = "username_taken"
+PHONE_TAKEN = "phone_taken"
+REGISTRATION_FAILED = "registration_failed"
+
 
 class AuthService:
     """
@@ -29,16 +46,17 @@ class AuthService:
     
     def __init__(self):
         self.redis_client = redis_client
-    
-    def _generate_user_id(self, username: str, phone: str) -> str:
-        """Generate unique user ID from username and phone."""
-        return hashlib.md5(f"{username}:{phone}".encode()).hexdigest()[:12]
+        self.redis_bytes_client = redis_bytes_client
+        # Bumped on every local user write to invalidate users_json_cache
+        self.users_generation = 0
+        # (generation, created_at, json_bytes) for get_all_users_json
+        self.users_json_cache = None
     
     def _generate_avatar_url(self, username: str) -> str:
         """Generate avatar URL for user."""
         return f"https://i.pravatar.cc/150?u={username}"
     
-    async def register_user(self, user_data: UserCreate) -> Optional[User]:
+    async def register_user(self, user_data: UserCreate) -> Tuple[Optional[User], Optional[str]]:
         """
         Register a new user with username and phone number.
         
@@ -46,16 +64,20 @@ class AuthService:
             user_data: UserCreate object with registration details
             
         Returns:
-            User: Complete user object if registration successful, None if failed
+            Tuple[Optional[User], Optional[str]]: (user, None) if registration
+            successful, otherwise (None, reason) where reason is USERNAME_TAKEN,
+            PHONE_TAKEN or REGISTRATION_FAILED
         """
         try:
-            # Check if username already exists
-            if await self.username_exists(user_data.username):
-                return None
-            
-            # Check if phone number already exists
-            if await self.phone_exists(user_data.phone_number):
-                return None
+            # Check username and phone number in one round trip
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.exists(f"user:{user_data.username}")
+            pipe.exists(f"phone:{user_data.phone_number}")
+            username_taken, phone_taken = pipe.execute()
+            if username_taken:
+                return None, USERNAME_TAKEN
+            if phone_taken:
+                return None, PHONE_TAKEN
             
             # Create user object
             user = User(
@@ -68,23 +90,29 @@ class AuthService:
                 is_active=True
             )
             
+            # Store the user, phone mapping and users list entry together
+            # (MULTI/EXEC, so a registration is never half-written)
+            pipe = self.redis_client.pipeline(transaction=True)
+            
             # Store user in Redis
             user_key = f"user:{user.username}"
-            user_json = user.model_dump_json()
-            self.redis_client.set(user_key, user_json)
+            pipe.set(user_key, _ENCODER.encode(user))
             
             # Store phone number mapping for lookup
             phone_key = f"phone:{user.phone_number}"
-            self.redis_client.set(phone_key, user.username)
+            pipe.set(phone_key, user.username)
             
             # Add to users list
-            self.redis_client.sadd("users:all", user.username)
+            pipe.sadd("users:all", user.username)
             
-            return user
+            pipe.execute()
+            self.users_generation += 1
+            
+            return user, None
             
         except Exception as e:
             print(f"Error registering user: {e}")
-            return None
+            return None, REGISTRATION_FAILED
     
     async def login_user(self, login_data: UserLogin) -> Optional[User]:
         """
@@ -127,20 +155,23 @@ class AuthService:
         Returns:
             User: User object if found, None if not found
         """
+        now = time.monotonic()
+        cached = _USER_CACHE.get(username)
+        if cached and now - cached[0] < USER_CACHE_TTL:
+            # Callers edit the user they get back, so never hand out the cached instance
+            return msgspec.structs.replace(cached[1])
+        
         try:
             user_key = f"user:{username}"
-            user_json = self.redis_client.get(user_key)
+            user_json = self.redis_bytes_client.get(user_key)
             
             if not user_json:
                 return None
             
-            user_dict = json.loads(user_json)
-            # Convert datetime strings back to datetime objects
-            user_dict['created_at'] = datetime.fromisoformat(user_dict['created_at'])
-            if user_dict.get('last_login'):
-                user_dict['last_login'] = datetime.fromisoformat(user_dict['last_login'])
-            
-            return User(**user_dict)
+            # msgspec decodes the raw bytes and parses the ISO datetimes itself
+            user = _USER_DECODER.decode(user_json)
+            _USER_CACHE[username] = (now, msgspec.structs.replace(user))
+            return user
             
         except Exception as e:
             print(f"Error getting user: {e}")
@@ -213,10 +244,15 @@ class AuthService:
         Returns:
             bool: True if update successful, False otherwise
         """
+        # Callers may have edited the cached instance in place; evict it
+        # first so a failed write can't leave those edits cached
+        _USER_CACHE.pop(user.username, None)
+        
         try:
             user_key = f"user:{user.username}"
-            user_json = user.model_dump_json()
+            user_json = _ENCODER.encode(user)
             self.redis_client.set(user_key, user_json)
+            self.users_generation += 1
             return True
         except Exception as e:
             print(f"Error updating user: {e}")
@@ -231,18 +267,56 @@ class AuthService:
         """
         try:
             usernames = self.redis_client.smembers("users:all")
+            if not usernames:
+                return []
+            
+            # Fetch every user record in one round trip
+            user_jsons = self.redis_bytes_client.mget([f"user:{username}" for username in usernames])
             users = []
             
-            for username in usernames:
-                user = await self.get_user(username)
-                if user:
-                    users.append(user)
+            for user_json in user_jsons:
+                if user_json:
+                    try:
+                        users.append(_USER_DECODER.decode(user_json))
+                    except msgspec.DecodeError as e:
+                        print(f"Error decoding user: {e}")
             
             return users
         except Exception as e:
             print(f"Error getting all users: {e}")
             return []
     
+    async def get_all_users_json(self) -> bytes:
+        """
+        Get the public user list already serialized as JSON.
+        
+        The bytes are reused until a user is registered or updated, or
+        USERS_JSON_CACHE_TTL seconds have passed.
+        
+        Returns:
+            bytes: JSON object with "users" and "count"
+        """
+        now = time.monotonic()
+        cached = self.users_json_cache
+        if (cached and cached[0] == self.users_generation
+                and now - cached[1] < USERS_JSON_CACHE_TTL):
+            return cached[2]
+        
+        generation = self.users_generation
+        users = await self.get_all_users()
+        payload = orjson.dumps({
+            "users": [{
+                "username": user.username,
+                "display_name": user.display_name,
+                "avatar_url": user.avatar_url,
+                "created_at": user.created_at.isoformat(),
+                "is_active": user.is_active
+            } for user in users],
+            "count": len(users)
+        })
+        self.users_json_cache = (generation, now, payload)
+        return payload
+    
     async def suggest_usernames(self, base_username: str) -> List[str]:
         """
         Suggest alternative usernames if the requested one is taken.
@@ -253,23 +327,21 @@ class AuthService:
         Returns:
             List[str]: List of suggested usernames
         """
-        suggestions = []
+        # Numbered candidates first, then underscore variants
+        candidates = [f"{base_username}{i}" for i in range(1, 100)]
+        candidates += [f"{base_username}_{i}" for i in range(1, 50)]
         
-        # Add numbers
-        for i in range(1, 100):
-            suggestion = f"{base_username}{i}"
-            if not await self.username_exists(suggestion):
-                suggestions.append(suggestion)
-                if len(suggestions) >= 5:
-                    break
+        # Check every candidate in one pipelined round trip
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for candidate in candidates:
+                pipe.exists(f"user:{candidate}")
+            taken = pipe.execute()
+        except Exception as e:
+            print(f"Error suggesting usernames: {e}")
+            return []
         
-        # Add underscores with numbers
-        for i in range(1, 50):
-            suggestion = f"{base_username}_{i}"
-            if not await self.username_exists(suggestion):
-                suggestions.append(suggestion)
-                if len(suggestions) >= 8:
-                    break
+        suggestions = [candidate for candidate, exists in zip(candidates, taken) if not exists]
         
         return suggestions[:5]  # Return top 5 suggestions
 
@@ -8,20 +8,54 @@ This service manages:
 - Real-time message broadcasting
 """
 
-import json
-import uuid
-from datetime import datetime
-from typing import List, Optional
-import sys
+import logging
 import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 
-# Add parent directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import msgspec
+import orjson
+from redis.exceptions import WatchError
 
-from chat_redis.redis_client import redis_client
-from chat_redis.publisher import publish_message
+from chat_redis.redis_client import redis_client, redis_bytes_client
 from models.message import Message, MessageCreate
 
+# Child of the "chat" logger, so records go through its queue handler
+logger = logging.getLogger("chat.chat_service")
+
+# Set of channel names that have stored messages
+CHANNELS_KEY = "chat:channels"
+
+# Approximate number of messages kept per channel stream
+HISTORY_MAX_LEN = 1000
+
+# Stream entries read per XRANGE/XREVRANGE when walking history
+HISTORY_CHUNK_SIZE = 100
+
+# Seconds a channel's history stream lives after its last message
+HISTORY_TTL = 30 * 24 * 60 * 60
+
+# Lists that held chat history (newest first) before it moved to streams
+LEGACY_HISTORY_PATTERN = "chat:*:messages"
+
+
+class _LegacyMessage(msgspec.Struct):
+    """A message as stored in the legacy history lists (naive UTC ISO timestamp)."""
+    sender: str
+    content: str
+    channel: str
+    message_type: str
+    timestamp: datetime
+    message_id: Optional[str] = None
+
+
+# Reused msgspec codecs for stored messages
+_ENCODER = msgspec.json.Encoder()
+_MESSAGE_DECODER = msgspec.json.Decoder(Message)
+_LEGACY_MESSAGE_DECODER = msgspec.json.Decoder(_LegacyMessage)
+
 
 class ChatService:
     """
@@ -30,6 +64,7 @@ class ChatService:
     
     def __init__(self):
         self.redis_client = redis_client
+        self.redis_bytes_client = redis_bytes_client
         self.default_channel = "general"
     
     async def save_message(self, message_data: MessageCreate) -> Message:
@@ -42,31 +77,93 @@ class ChatService:
         Returns:
             Message: Complete message object with timestamp and ID
         """
-        # Create complete message object
-        message = Message(
-            sender=message_data.sender,
-            content=message_data.content,
-            channel=message_data.channel,
-            message_type=message_data.message_type,
-            timestamp=datetime.utcnow(),
-            message_id=str(uuid.uuid4())
-        )
+        message = self.build_message(message_data.model_dump())
         
-        # Store in Redis list for chat history
-        message_key = f"chat:{message.channel}:messages"
-        message_json = message.model_dump_json()
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._queue_save(pipe, message)
+        pipe.execute()
         
-        # Add to list (LPUSH adds to beginning, so newest messages are first)
-        self.redis_client.lpush(message_key, message_json)
+        return message
+    
+    async def save_and_publish(self, message_data: MessageCreate) -> Message:
+        """
+        Save a message and publish it to Redis pub/sub in one round trip.
         
-        # Keep only last 1000 messages per channel
-        self.redis_client.ltrim(message_key, 0, 999)
+        Args:
+            message_data: MessageCreate object with message details
+            
+        Returns:
+            Message: Complete message object with timestamp and ID
+        """
+        message = self.build_message(message_data.model_dump())
         
-        # Set expiration for the message list (30 days)
-        self.redis_client.expire(message_key, 30 * 24 * 60 * 60)
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._queue_save(pipe, message)
+        pipe.publish(f"chat:{message.channel}", self.encode_message_event(message))
+        pipe.execute()
         
         return message
     
+    def _generate_message_id(self, timestamp_ms: int) -> str:
+        """
+        Generate a time-ordered UUID (version 7) for a message.
+        
+        The leading 48 bits are the creation time in epoch milliseconds, so
+        IDs sort by creation time; the rest is random apart from the
+        version and variant bits.
+        """
+        value = (timestamp_ms << 80) | int.from_bytes(os.urandom(10), "big")
+        value = (value & ~(0xF << 76)) | (0x7 << 76)  # version 7
+        value = (value & ~(0x3 << 62)) | (0x2 << 62)  # RFC 4122 variant
+        return str(uuid.UUID(int=value))
+    
+    def build_message(self, message_data: dict) -> Message:
+        """
+        Create complete message object with timestamp and ID.
+        
+        The fields are trusted to be validated already (by MessageCreate
+        or the WebSocket decoder); msgspec Structs don't re-validate.
+        
+        Args:
+            message_data: Dict with sender, content, channel and message_type
+            
+        Returns:
+            Message: Complete message object
+        """
+        timestamp = time.time_ns() // 1_000_000
+        return Message(
+            sender=message_data["sender"],
+            content=message_data["content"],
+            channel=message_data["channel"],
+            message_type=message_data["message_type"],
+            timestamp=timestamp,
+            message_id=self._generate_message_id(timestamp)
+        )
+    
+    def _stream_key(self, channel: str) -> str:
+        """Redis stream holding a channel's chat history."""
+        return f"chat:{channel}:stream"
+    
+    def _queue_save(self, pipe, message: Message):
+        """Add the commands that store a message in chat history to a pipeline."""
+        stream_key = self._stream_key(message.channel)
+        
+        # Append to the channel's stream, trimming it to roughly the last
+        # 1000 messages in the same command. The message ID is kept as its
+        # own field so deletes can match it without decoding the payload.
+        pipe.xadd(
+            stream_key,
+            {"id": message.message_id, "data": _ENCODER.encode(message)},
+            maxlen=HISTORY_MAX_LEN,
+            approximate=True
+        )
+        
+        # Set expiration for the stream (30 days)
+        pipe.expire(stream_key, HISTORY_TTL)
+        
+        # Track the channel so listing channels never scans the keyspace
+        pipe.sadd(CHANNELS_KEY, message.channel)
+    
     async def publish_message(self, message: Message) -> bool:
         """
         Publish message to Redis pub/sub channel for real-time broadcasting.
@@ -77,26 +174,80 @@ class ChatService:
         Returns:
             bool: True if published successfully
         """
+        # Publish the same orjson-encoded event the batched paths send
+        return await self.publish_raw(message.channel, self.encode_message_event(message))
+    
+    async def publish_raw(self, channel: str, payload: bytes) -> bool:
+        """
+        Publish an already-encoded event to a channel without re-serializing.
+        
+        Args:
+            channel: Channel name (without the "chat:" prefix)
+            payload: Encoded JSON event exactly as WebSocket clients receive it
+            
+        Returns:
+            bool: True if published successfully
+        """
+        try:
+            self.redis_client.publish(f"chat:{channel}", payload)
+            
+            return True
+        except Exception as e:
+            logger.error("Error publishing message: %s", e)
+            return False
+    
+    async def publish_batch(self, events: List[Tuple[str, bytes, Optional[Message]]]) -> bool:
+        """
+        Publish several pre-encoded events to Redis pub/sub in a single pipeline.
+        
+        Args:
+            events: (channel, payload, message) tuples; payload is the encoded
+                JSON event exactly as WebSocket clients receive it. When
+                message is set it is saved to chat history before publishing.
+            
+        Returns:
+            bool: True if all events were published successfully
+        """
         try:
-            # Convert message to dict for JSON serialization
-            message_dict = {
-                "sender": message.sender,
-                "content": message.content,
-                "channel": message.channel,
-                "message_type": message.message_type,
-                "timestamp": message.timestamp.isoformat(),
-                "message_id": message.message_id
-            }
-            
-            # Publish to Redis channel
-            channel_name = f"chat:{message.channel}"
-            publish_message(channel_name, message_dict)
+            pipe = self.redis_client.pipeline(transaction=False)
+            for channel, payload, message in events:
+                if message is not None:
+                    self._queue_save(pipe, message)
+                pipe.publish(f"chat:{channel}", payload)
+            pipe.execute()
             
             return True
         except Exception as e:
-            print(f"Error publishing message: {e}")
+            logger.error("Error publishing message batch: %s", e)
             return False
     
+    def encode_message_event(self, message: Message) -> bytes:
+        """
+        Encode a message as the JSON event WebSocket clients receive.
+        
+        Args:
+            message: Complete message object
+            
+        Returns:
+            bytes: UTF-8 JSON payload, shared by Redis and WebSocket delivery
+        """
+        return orjson.dumps(self._to_pubsub_dict(message))
+    
+    def _to_pubsub_dict(self, message: Message) -> dict:
+        """
+        Convert message to the JSON event WebSocket clients receive.
+        The timestamp is already integer epoch milliseconds.
+        """
+        return {
+            "type": "message",
+            "sender": message.sender,
+            "content": message.content,
+            "channel": message.channel,
+            "message_type": message.message_type,
+            "timestamp": message.timestamp,
+            "message_id": message.message_id
+        }
+    
     async def get_chat_history(self, channel: str = None, limit: int = 50) -> List[Message]:
         """
         Retrieve chat history from Redis.
@@ -111,29 +262,68 @@ class ChatService:
         if not channel:
             channel = self.default_channel
             
-        message_key = f"chat:{channel}:messages"
-        
         try:
-            # Get messages from Redis list (LRANGE gets from list)
-            # Get from end to beginning to maintain chronological order
-            message_strings = self.redis_client.lrange(message_key, 0, limit - 1)
+            # Newest entries first, reversed below for chronological order.
+            # Fields come back as raw bytes for msgspec to decode directly.
+            entries = self.redis_bytes_client.xrevrange(self._stream_key(channel), count=limit)
             
-            messages = []
-            for msg_str in reversed(message_strings):  # Reverse to get chronological order
-                try:
-                    message_dict = json.loads(msg_str)
-                    # Convert timestamp string back to datetime
-                    message_dict['timestamp'] = datetime.fromisoformat(message_dict['timestamp'])
-                    messages.append(Message(**message_dict))
-                except (json.JSONDecodeError, ValueError) as e:
-                    print(f"Error parsing message: {e}")
-                    continue
-            
-            return messages
+            # One typed decode per entry
+            return [_MESSAGE_DECODER.decode(fields[b"data"]) for _entry_id, fields in reversed(entries)]
+        except msgspec.DecodeError as e:
+            # Entries are only ever written by _queue_save, so this is rare
+            logger.error("Error parsing message: %s", e)
+            return []
         except Exception as e:
-            print(f"Error retrieving chat history: {e}")
+            logger.error("Error retrieving chat history: %s", e)
             return []
     
+    async def iter_chat_history(self, channel: str = None, limit: int = 50, chunk_size: int = HISTORY_CHUNK_SIZE):
+        """
+        Yield stored chat history in chronological order, fetching it from
+        Redis in chunks so large histories are never held in memory at once.
+        
+        Args:
+            channel: Channel name (defaults to general)
+            limit: Maximum number of messages to yield
+            chunk_size: Messages fetched per XRANGE/XREVRANGE
+            
+        Yields:
+            bytes: Each message as its stored JSON
+        """
+        if not channel:
+            channel = self.default_channel
+        
+        stream_key = self._stream_key(channel)
+        total = self.redis_bytes_client.xlen(stream_key)
+        count = min(limit, total)
+        if count <= 0:
+            return
+        
+        # Find the oldest entry of the window by walking back from the
+        # newest one; only entry IDs are kept on this pass
+        start = "-"
+        if count < total:
+            seen = 0
+            end = "+"
+            while seen < count:
+                entries = self.redis_bytes_client.xrevrange(stream_key, max=end, count=min(chunk_size, count - seen))
+                if not entries:
+                    break
+                seen += len(entries)
+                start = entries[-1][0]
+                end = b"(" + start
+        
+        # Then read the window forwards
+        remaining = count
+        while remaining > 0:
+            entries = self.redis_bytes_client.xrange(stream_key, min=start, count=min(chunk_size, remaining))
+            if not entries:
+                break
+            for _entry_id, fields in entries:
+                yield fields[b"data"]
+            remaining -= len(entries)
+            start = b"(" + entries[-1][0]
+    
     async def get_active_channels(self) -> List[str]:
         """
         Get list of active chat channels.
@@ -142,24 +332,141 @@ class ChatService:
             List[str]: List of channel names that have messages
         """
         try:
-            # Find all chat message keys
-            pattern = "chat:*:messages"
-            keys = self.redis_client.keys(pattern)
+            channels = self.redis_client.smembers(CHANNELS_KEY)
+            if channels:
+                return list(channels)
             
-            # Extract channel names from keys
+            # Recovery only: rebuild the set from existing message keys
+            # (e.g. history stored before the set was maintained)
             channels = []
-            for key in keys:
-                # Extract channel name from "chat:channel_name:messages"
+            for key in self.redis_client.scan_iter(match="chat:*:stream", count=500):
+                # Extract channel name from "chat:channel_name:stream"
                 parts = key.split(':')
                 if len(parts) >= 3:
-                    channel_name = parts[1]
-                    channels.append(channel_name)
+                    channels.append(parts[1])
+            
+            if channels:
+                self.redis_client.sadd(CHANNELS_KEY, *channels)
             
             return channels
         except Exception as e:
-            print(f"Error getting active channels: {e}")
+            logger.error("Error getting active channels: %s", e)
             return [self.default_channel]
     
+    async def migrate_legacy_history(self) -> int:
+        """
+        Move chat history stored in the legacy chat:{channel}:messages lists
+        into the channel streams, so it stays visible after the move to
+        streams. Safe to run from several workers at once.
+        
+        Returns:
+            int: Number of channels migrated
+        """
+        migrated = 0
+        try:
+            for key in self.redis_client.scan_iter(match=LEGACY_HISTORY_PATTERN, count=500):
+                if self._migrate_legacy_channel(key[len("chat:"):-len(":messages")]):
+                    migrated += 1
+        except Exception as e:
+            logger.error("Error migrating legacy chat history: %s", e)
+        return migrated
+    
+    def _migrate_legacy_channel(self, channel: str) -> bool:
+        """
+        Merge one channel's legacy history list into its stream, in
+        timestamp order, and delete the list.
+        
+        Runs under WATCH on both keys and skips message IDs the stream
+        already holds, so a concurrent migration or a message saved in the
+        meantime just makes it retry.
+        
+        Returns:
+            bool: True if this call migrated the list
+        """
+        list_key = f"chat:{channel}:messages"
+        stream_key = self._stream_key(channel)
+        
+        with self.redis_bytes_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    pipe.watch(list_key, stream_key)
+                    raw_messages = pipe.lrange(list_key, 0, -1)
+                    if not raw_messages:
+                        return False  # already migrated
+                    
+                    messages = {}
+                    for _entry_id, fields in pipe.xrange(stream_key):
+                        message = _MESSAGE_DECODER.decode(fields[b"data"])
+                        messages[message.message_id] = message
+                    for raw in reversed(raw_messages):  # lists are newest first
+                        try:
+                            message = self._from_legacy(_LEGACY_MESSAGE_DECODER.decode(raw))
+                        except msgspec.DecodeError as e:
+                            logger.warning("Skipping undecodable legacy message in %s: %s", channel, e)
+                            continue
+                        messages.setdefault(message.message_id, message)
+                    merged = sorted(messages.values(), key=lambda message: message.timestamp)[-HISTORY_MAX_LEN:]
+                    
+                    # Rewrite the stream with IDs taken from the message
+                    # timestamps, so entries stay in time order and new
+                    # auto-ID entries land after them
+                    pipe.multi()
+                    pipe.delete(stream_key)
+                    last_ms, seq = 0, 0
+                    for message in merged:
+                        if message.timestamp > last_ms:
+                            last_ms, seq = message.timestamp, 0
+                        else:
+                            seq += 1
+                        pipe.xadd(
+                            stream_key,
+                            {"id": message.message_id, "data": _ENCODER.encode(message)},
+                            id=f"{last_ms}-{seq}"
+                        )
+                    if merged:
+                        pipe.expire(stream_key, HISTORY_TTL)
+                        pipe.sadd(CHANNELS_KEY, channel)
+                    pipe.delete(list_key)
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    continue  # a key changed under us; reread both
+    
+    def _from_legacy(self, legacy: _LegacyMessage) -> Message:
+        """Convert a legacy list entry to a Message with an epoch-ms timestamp."""
+        created = legacy.timestamp
+        if created.tzinfo is None:  # stored from datetime.utcnow()
+            created = created.replace(tzinfo=timezone.utc)
+        timestamp = int(created.timestamp() * 1000)
+        return Message(
+            sender=legacy.sender,
+            content=legacy.content,
+            channel=legacy.channel,
+            message_type=legacy.message_type,
+            timestamp=timestamp,
+            message_id=legacy.message_id or self._generate_message_id(timestamp)
+        )
+    
+    async def on_key_expired(self, key: str) -> bool:
+        """
+        React to a Redis key expiring. When a channel's history stream
+        expires, drop the channel from the channel set.
+        
+        Args:
+            key: Name of the expired key
+            
+        Returns:
+            bool: True if a channel was removed
+        """
+        if not (key.startswith("chat:") and key.endswith(":stream")):
+            return False
+        
+        try:
+            return self.redis_client.srem(CHANNELS_KEY, key[len("chat:"):-len(":stream")]) > 0
+        except Exception as e:
+            logger.error("Error handling expired key %s: %s", key, e)
+            return False
+    
     async def delete_message(self, message_id: str, channel: str) -> bool:
         """
         Delete a specific message from chat history.
@@ -171,29 +478,23 @@ class ChatService:
         Returns:
             bool: True if message was deleted successfully
         """
-        message_key = f"chat:{channel}:messages"
+        stream_key = self._stream_key(channel)
+        message_id = message_id.encode()
         
         try:
-            # Get all messages
-            message_strings = self.redis_client.lrange(message_key, 0, -1)
-            
-            # Find and remove the message with matching ID
-            for i, msg_str in enumerate(message_strings):
-                try:
-                    message_dict = json.loads(msg_str)
-                    if message_dict.get('message_id') == message_id:
-                        # Remove the message at this index
-                        # Redis doesn't have direct index removal, so we use a placeholder
-                        placeholder = f"__DELETED__{uuid.uuid4()}"
-                        self.redis_client.lset(message_key, i, placeholder)
-                        self.redis_client.lrem(message_key, 1, placeholder)
-                        return True
-                except json.JSONDecodeError:
-                    continue
-            
-            return False
+            # Walk back from the newest entry (deletes usually target recent
+            # messages), matching the stored ID field, then XDEL that entry
+            end = "+"
+            while True:
+                entries = self.redis_bytes_client.xrevrange(stream_key, max=end, count=HISTORY_CHUNK_SIZE)
+                if not entries:
+                    return False
+                for entry_id, fields in entries:
+                    if fields.get(b"id") == message_id:
+                        return self.redis_bytes_client.xdel(stream_key, entry_id) > 0
+                end = b"(" + entries[-1][0]
         except Exception as e:
-            print(f"Error deleting message: {e}")
+            logger.error("Error deleting message: %s", e)
             return False
 
 
@@ -7,19 +7,27 @@ This service manages:
 - Group settings and metadata
 """
 
-import json
+import time
 import uuid
 from datetime import datetime
-from typing import List, Optional
-import sys
-import os
+from typing import Dict, List, Optional, Tuple
 
-# Add parent directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import msgspec
 
-from chat_redis.redis_client import redis_client
+from chat_redis.redis_client import redis_client, redis_bytes_client
 from models.message import Group, GroupCreate, GroupUpdate
 
+# Reused msgspec codecs for stored groups
+_ENCODER = msgspec.json.Encoder()
+_GROUP_DECODER = msgspec.json.Decoder(Group)
+
+# Seconds a group read by get_group is served from memory; kept short since
+# writes made by other workers only show up once an entry expires
+GROUP_CACHE_TTL = 5.0
+
+# group_id -> (fetched_at, group) for get_group
+_GROUP_CACHE: Dict[str, Tuple[float, Group]] = {}
+
 
 class GroupService:
     """
@@ -28,6 +36,7 @@ class GroupService:
     
     def __init__(self):
         self.redis_client = redis_client
+        self.redis_bytes_client = redis_bytes_client
     
     def _generate_group_id(self, name: str, creator: str) -> str:
         """Generate unique group ID."""
@@ -61,16 +70,24 @@ class GroupService:
                 admins=[group_data.created_by]
             )
             
-            # Store group in Redis
+            # Store everything in one round trip
             group_key = f"group:{group_id}"
-            group_json = group.model_dump_json()
-            self.redis_client.set(group_key, group_json)
+            pipe = self.redis_client.pipeline(transaction=False)
+            
+            # Group metadata
+            pipe.set(group_key, self._encode_metadata(group))
+            
+            # Creator is the first member and admin
+            pipe.sadd(f"{group_key}:members", group_data.created_by)
+            pipe.sadd(f"{group_key}:admins", group_data.created_by)
             
             # Add to groups list
-            self.redis_client.sadd("groups:all", group_id)
+            pipe.sadd("groups:all", group_id)
             
             # Add user to group members
-            self.redis_client.sadd(f"user:{group_data.created_by}:groups", group_id)
+            pipe.sadd(f"user:{group_data.created_by}:groups", group_id)
+            
+            pipe.execute()
             
             return group
             
@@ -88,17 +105,18 @@ class GroupService:
         Returns:
             Group: Group object if found, None if not found
         """
+        now = time.monotonic()
+        cached = _GROUP_CACHE.get(group_id)
+        if cached and now - cached[0] < GROUP_CACHE_TTL:
+            return cached[1]
+        
         try:
-            group_key = f"group:{group_id}"
-            group_json = self.redis_client.get(group_key)
-            
-            if not group_json:
+            groups = self._get_groups([group_id])
+            if not groups:
                 return None
             
-            group_dict = json.loads(group_json)
-            group_dict['created_at'] = datetime.fromisoformat(group_dict['created_at'])
-            
-            return Group(**group_dict)
+            _GROUP_CACHE[group_id] = (now, groups[0])
+            return groups[0]
             
         except Exception as e:
             print(f"Error getting group: {e}")
@@ -134,9 +152,7 @@ class GroupService:
                 group.image_url = update_data.image_url
             
             # Save updated group
-            group_key = f"group:{group_id}"
-            group_json = group.model_dump_json()
-            self.redis_client.set(group_key, group_json)
+            self._save_group(group)
             
             return group
             
@@ -157,25 +173,19 @@ class GroupService:
             bool: True if successful, False otherwise
         """
         try:
-            group = await self.get_group(group_id)
-            if not group:
-                return False
+            group_key = f"group:{group_id}"
             
-            # Check if user is admin
-            if added_by not in group.admins:
+            # Check if user is admin (also false for a missing group)
+            if not self._is_admin(group_id, added_by):
                 return False
             
-            # Add member if not already in group
-            if username not in group.members:
-                group.members.append(username)
-                
-                # Save updated group
-                group_key = f"group:{group_id}"
-                group_json = group.model_dump_json()
-                self.redis_client.set(group_key, group_json)
-                
-                # Add group to user's groups
-                self.redis_client.sadd(f"user:{username}:groups", group_id)
+            # Add member and the group to the user's groups; both are no-ops
+            # if the user is already in the group
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.sadd(f"{group_key}:members", username)
+            pipe.sadd(f"user:{username}:groups", group_id)
+            pipe.execute()
+            _GROUP_CACHE.pop(group_id, None)
             
             return True
             
@@ -196,29 +206,25 @@ class GroupService:
             bool: True if successful, False otherwise
         """
         try:
-            group = await self.get_group(group_id)
-            if not group:
+            group_key = f"group:{group_id}"
+            
+            if not self.redis_client.exists(group_key):
                 return False
             
-            # Check if user is admin or removing themselves
-            if removed_by not in group.admins and removed_by != username:
+            # Check if user is admin or removing themselves (the admin check
+            # also migrates a legacy group, so the SREMs below take effect)
+            is_admin = self._is_admin(group_id, removed_by)
+            if not is_admin and removed_by != username:
                 return False
             
-            # Remove member
-            if username in group.members:
-                group.members.remove(username)
-                
-                # Remove from admins if they were admin
-                if username in group.admins:
-                    group.admins.remove(username)
-                
-                # Save updated group
-                group_key = f"group:{group_id}"
-                group_json = group.model_dump_json()
-                self.redis_client.set(group_key, group_json)
-                
-                # Remove group from user's groups
-                self.redis_client.srem(f"user:{username}:groups", group_id)
+            # Remove member (and admin rights), and the group from the
+            # user's groups; all no-ops if the user isn't in the group
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.srem(f"{group_key}:members", username)
+            pipe.srem(f"{group_key}:admins", username)
+            pipe.srem(f"user:{username}:groups", group_id)
+            pipe.execute()
+            _GROUP_CACHE.pop(group_id, None)
             
             return True
             
@@ -226,6 +232,95 @@ class GroupService:
             print(f"Error removing member: {e}")
             return False
     
+    def _is_admin(self, group_id: str, username: str) -> bool:
+        """
+        Check admin rights against the group's admins set, moving a legacy
+        group's embedded lists into its sets first.
+        """
+        group_key = f"group:{group_id}"
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.sismember(f"{group_key}:admins", username)
+        pipe.exists(f"{group_key}:members", f"{group_key}:admins")
+        is_admin, sets_exist = pipe.execute()
+        if is_admin or sets_exist:
+            return bool(is_admin)
+        
+        # No sets yet: either a missing group or one stored with embedded
+        # lists, which _get_groups migrates
+        groups = self._get_groups([group_id])
+        return bool(groups) and username in groups[0].admins
+    
+    def _migrate_legacy_groups(self, groups: List[Group]):
+        """
+        Copy the embedded members and admins of groups stored before the
+        member sets existed into those sets, then blank the lists in the
+        stored JSON. Runs as one MULTI/EXEC so the lists are only dropped
+        together with the sets being written.
+        """
+        pipe = self.redis_client.pipeline(transaction=True)
+        for group in groups:
+            group_key = f"group:{group.id}"
+            if group.members:
+                pipe.sadd(f"{group_key}:members", *group.members)
+            if group.admins:
+                pipe.sadd(f"{group_key}:admins", *group.admins)
+            pipe.set(group_key, self._encode_metadata(group))
+            _GROUP_CACHE.pop(group.id, None)
+        pipe.execute()
+    
+    def _encode_metadata(self, group: Group) -> bytes:
+        """Encode a group for storage, leaving out members and admins."""
+        return _ENCODER.encode(msgspec.structs.replace(group, members=[], admins=[]))
+    
+    def _save_group(self, group: Group):
+        """Write back metadata of a group fetched with get_group and edited in place."""
+        # Evict first so a failed write can't leave the edits cached
+        _GROUP_CACHE.pop(group.id, None)
+        self.redis_client.set(f"group:{group.id}", self._encode_metadata(group))
+    
+    def _get_groups(self, group_ids) -> List[Group]:
+        """
+        Fetch several groups with their members and admins in one pipelined
+        round trip, skipping missing ones.
+        """
+        if not group_ids:
+            return []
+        
+        pipe = self.redis_bytes_client.pipeline(transaction=False)
+        for group_id in group_ids:
+            group_key = f"group:{group_id}"
+            pipe.get(group_key)
+            pipe.smembers(f"{group_key}:members")
+            pipe.smembers(f"{group_key}:admins")
+        results = pipe.execute()
+        groups = []
+        legacy_groups = []
+        
+        for i in range(0, len(results), 3):
+            group_json, members, admins = results[i:i + 3]
+            if not group_json:
+                continue
+            try:
+                # msgspec decodes the raw bytes and parses the ISO datetime itself
+                group = _GROUP_DECODER.decode(group_json)
+            except msgspec.DecodeError as e:
+                print(f"Error decoding group: {e}")
+                continue
+            
+            if members or admins:
+                group.members = sorted(member.decode() for member in members)
+                group.admins = sorted(admin.decode() for admin in admins)
+            elif group.members or group.admins:
+                # Stored before the member sets existed; keep the embedded
+                # lists and move them into the sets
+                legacy_groups.append(group)
+            groups.append(group)
+        
+        if legacy_groups:
+            self._migrate_legacy_groups(legacy_groups)
+        
+        return groups
+    
     async def get_user_groups(self, username: str) -> List[Group]:
         """
         Get all groups for a user.
@@ -238,14 +333,7 @@ class GroupService:
         """
         try:
             group_ids = self.redis_client.smembers(f"user:{username}:groups")
-            groups = []
-            
-            for group_id in group_ids:
-                group = await self.get_group(group_id)
-                if group:
-                    groups.append(group)
-            
-            return groups
+            return self._get_groups(group_ids)
             
         except Exception as e:
             print(f"Error getting user groups: {e}")
@@ -260,14 +348,7 @@ class GroupService:
         """
         try:
             group_ids = self.redis_client.smembers("groups:all")
-            groups = []
-            
-            for group_id in group_ids:
-                group = await self.get_group(group_id)
-                if group:
-                    groups.append(group)
-            
-            return groups
+            return self._get_groups(group_ids)
             
         except Exception as e:
             print(f"Error getting all groups: {e}")
@@ -8,28 +8,60 @@ This service handles:
 - User presence in channels
 """
 
-import json
-from datetime import datetime, timedelta
+import functools
+import logging
+import time
+from datetime import datetime, timezone
 from typing import Dict, List, Set
-import sys
-import os
 
-# Add parent directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chat_redis.redis_client import async_redis_str_client
+from models.message import UserStatus
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Child of the "chat" logger, so records go through its queue handler
+logger = logging.getLogger("chat.user_service")
+
+# Seconds a user stays in a channel's presence set without rejoining
+PRESENCE_TTL = 3600
+
+# Record a user's join in the channel presence sorted set (score = join
+# time in epoch ms) and prune members not seen within the TTL. The TTL is
+# per member via the score, so the set itself never expires; once every
+# member is pruned (here or by cleanup_expired_users) Redis deletes it.
+# KEYS: channel presence set
+# ARGV: username, now (epoch ms), TTL (seconds)
+JOIN_CHANNEL_LUA = """
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2] - ARGV[3] * 1000)
+return 1
+"""
 
-from chat_redis.redis_client import redis_client
-from models.message import UserStatus
+
+# Key names are rebuilt on every join, leave and keystroke for the same
+# few channels and users, so reuse the formatted strings
+@functools.lru_cache(maxsize=4096)
+def _presence_key(channel: str) -> str:
+    """Redis key of a channel's presence sorted set."""
+    return f"presence:{channel}"
+
+
+@functools.lru_cache(maxsize=4096)
+def _typing_key(channel: str, username: str) -> str:
+    """Redis key of a user's typing indicator in a channel."""
+    return f"typing:{channel}:{username}"
 
 
 class UserService:
     """
     Service class for user management using Redis.
+    
+    Uses the asyncio Redis client, so every call yields to the event loop
+    while waiting on Redis.
     """
     
     def __init__(self):
-        self.redis_client = redis_client
+        self.redis_client = async_redis_str_client
+        # Called via EVALSHA; redis-py loads it on first use (NOSCRIPT)
+        self._join_channel_script = self.redis_client.register_script(JOIN_CHANNEL_LUA)
         self.online_users: Dict[str, Set[str]] = {}  # channel -> set of usernames
         self.user_sessions: Dict[str, str] = {}  # websocket_id -> username
     
@@ -55,31 +87,20 @@ class UserService:
                 self.online_users[channel] = set()
             self.online_users[channel].add(username)
             
-            # Store in Redis with expiration
-            user_key = f"user:{username}:status"
-            user_data = {
-                "username": username,
-                "status": "online",
-                "last_seen": datetime.utcnow().isoformat(),
-                "channel": channel
-            }
-            
-            # Store user status in Redis (expires in 1 hour)
-            self.redis_client.setex(user_key, 3600, json.dumps(user_data))
-            
-            # Add to channel users set
-            channel_users_key = f"channel:{channel}:users"
-            self.redis_client.sadd(channel_users_key, username)
-            self.redis_client.expire(channel_users_key, 3600)
+            # Add to the channel presence set atomically in one script call
+            await self._join_channel_script(
+                keys=[_presence_key(channel)],
+                args=[username, time.time_ns() // 1_000_000, PRESENCE_TTL]
+            )
             
             return True
         except Exception as e:
-            print(f"Error adding user to channel: {e}")
+            logger.error("Error adding user to channel: %s", e)
             return False
     
     async def remove_user_from_channel(self, username: str, channel: str, websocket_id: str = None) -> bool:
         """
-        Remove user from channel and update status.
+        Remove user from channel.
         
         Args:
             username: User's display name
@@ -98,27 +119,28 @@ class UserService:
             if channel in self.online_users and username in self.online_users[channel]:
                 self.online_users[channel].discard(username)
             
-            # Update user status in Redis
-            user_key = f"user:{username}:status"
-            user_data = {
-                "username": username,
-                "status": "offline",
-                "last_seen": datetime.utcnow().isoformat(),
-                "channel": channel
-            }
-            
-            # Store offline status (expires in 24 hours)
-            self.redis_client.setex(user_key, 24 * 3600, json.dumps(user_data))
-            
-            # Remove from channel users set
-            channel_users_key = f"channel:{channel}:users"
-            self.redis_client.srem(channel_users_key, username)
+            # Remove from the channel presence set
+            await self.redis_client.zrem(_presence_key(channel), username)
             
             return True
         except Exception as e:
-            print(f"Error removing user from channel: {e}")
+            logger.error("Error removing user from channel: %s", e)
             return False
     
+    async def _iter_presence(self, channel: str):
+        """
+        Yield (username, join time in epoch ms) for members of a channel seen
+        within the TTL.
+        
+        ZSCAN pages through the set a few hundred members per call, so a
+        very large channel never comes back as one huge reply or holds up
+        Redis; stale members are skipped here instead of by score range.
+        """
+        since = time.time_ns() // 1_000_000 - PRESENCE_TTL * 1000
+        async for username, score in self.redis_client.zscan_iter(_presence_key(channel), count=500):
+            if score >= since:
+                yield username, score
+    
     async def get_online_users(self, channel: str) -> List[UserStatus]:
         """
         Get list of online users in a channel.
@@ -130,31 +152,42 @@ class UserService:
             List[UserStatus]: List of online users with their status
         """
         try:
-            channel_users_key = f"channel:{channel}:users"
-            usernames = self.redis_client.smembers(channel_users_key)
+            # Members seen within the TTL, oldest join first
+            members = sorted(
+                [(score, username) async for username, score in self._iter_presence(channel)]
+            )
             
-            online_users = []
-            for username in usernames:
-                user_key = f"user:{username}:status"
-                user_data_str = self.redis_client.get(user_key)
-                
-                if user_data_str:
-                    try:
-                        user_data = json.loads(user_data_str)
-                        user_status = UserStatus(
-                            username=user_data["username"],
-                            status=user_data["status"],
-                            last_seen=datetime.fromisoformat(user_data["last_seen"])
-                        )
-                        online_users.append(user_status)
-                    except (json.JSONDecodeError, ValueError, KeyError):
-                        continue
+            online_users = [
+                UserStatus(
+                    username=username,
+                    status="online",
+                    last_seen=datetime.fromtimestamp(score / 1000, timezone.utc)
+                )
+                for score, username in members
+            ]
             
             return online_users
         except Exception as e:
-            print(f"Error getting online users: {e}")
+            logger.error("Error getting online users: %s", e)
             return []
     
+    async def get_channel_join_times(self, channel: str) -> Dict[str, int]:
+        """
+        Get the users currently in a channel, across all workers.
+        
+        Args:
+            channel: Channel name
+            
+        Returns:
+            Dict[str, int]: Username -> last join time (epoch ms) from the
+            channel's Redis presence set
+        """
+        try:
+            return {username: int(score) async for username, score in self._iter_presence(channel)}
+        except Exception as e:
+            logger.error("Error getting channel users: %s", e)
+            return {}
+    
     async def set_user_typing(self, username: str, channel: str, is_typing: bool = True) -> bool:
         """
         Set user typing status.
@@ -168,18 +201,18 @@ class UserService:
             bool: True if status was updated successfully
         """
         try:
-            typing_key = f"typing:{channel}:{username}"
+            typing_key = _typing_key(channel, username)
             
             if is_typing:
                 # Set typing status with 10 second expiration
-                self.redis_client.setex(typing_key, 10, "typing")
+                await self.redis_client.setex(typing_key, 10, "typing")
             else:
                 # Remove typing status
-                self.redis_client.delete(typing_key)
+                await self.redis_client.delete(typing_key)
             
             return True
         except Exception as e:
-            print(f"Error setting typing status: {e}")
+            logger.error("Error setting typing status: %s", e)
             return False
     
     async def get_typing_users(self, channel: str) -> List[str]:
@@ -194,10 +227,11 @@ class UserService:
         """
         try:
             pattern = f"typing:{channel}:*"
-            keys = self.redis_client.keys(pattern)
             
             typing_users = []
-            for key in keys:
+            # SCAN walks the keyspace incrementally instead of blocking
+            # Redis like KEYS does
+            async for key in self.redis_client.scan_iter(match=pattern, count=500):
                 # Extract username from "typing:channel:username"
                 parts = key.split(':')
                 if len(parts) >= 3:
@@ -206,7 +240,7 @@ class UserService:
             
             return typing_users
         except Exception as e:
-            print(f"Error getting typing users: {e}")
+            logger.error("Error getting typing users: %s", e)
             return []
     
     def get_username_by_websocket(self, websocket_id: str) -> str:
@@ -221,9 +255,28 @@ class UserService:
         """
         return self.user_sessions.get(websocket_id)
     
+    async def enable_expiry_notifications(self) -> bool:
+        """
+        Turn on Redis key-expiry notifications (notify-keyspace-events Ex),
+        keeping any notification classes that are already enabled.
+        
+        Returns:
+            bool: True if expired-key events will be published
+        """
+        try:
+            config = await self.redis_client.config_get("notify-keyspace-events")
+            flags = config.get("notify-keyspace-events", "")
+            if "E" in flags and ("x" in flags or "A" in flags):
+                return True
+            await self.redis_client.config_set("notify-keyspace-events", "".join(sorted(set(flags + "Ex"))))
+            return True
+        except Exception as e:
+            logger.warning("Key-expiry notifications unavailable: %s", e)
+            return False
+    
     async def cleanup_expired_users(self) -> int:
         """
-        Clean up expired user sessions and typing indicators.
+        Clean up stale channel presence entries and typing indicators.
         
         Returns:
             int: Number of expired entries cleaned up
@@ -233,31 +286,26 @@ class UserService:
             
             # Clean up expired typing indicators
             typing_pattern = "typing:*"
-            typing_keys = self.redis_client.keys(typing_pattern)
-            
-            for key in typing_keys:
-                # Check if key still exists (Redis auto-expires them)
-                if not self.redis_client.exists(key):
-                    cleaned_count += 1
-            
-            # Clean up offline users from channel sets
-            channel_pattern = "channel:*:users"
-            channel_keys = self.redis_client.keys(channel_pattern)
+            typing_keys = [key async for key in self.redis_client.scan_iter(match=typing_pattern, count=500)]
+            if typing_keys:
+                # Check if keys still exist (Redis auto-expires them)
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key in typing_keys:
+                    pipe.exists(key)
+                cleaned_count += sum(1 for exists in await pipe.execute() if not exists)
             
-            for channel_key in channel_keys:
-                usernames = self.redis_client.smembers(channel_key)
-                for username in usernames:
-                    user_key = f"user:{username}:status"
-                    user_data_str = self.redis_client.get(user_key)
-                    
-                    if not user_data_str:
-                        # User data expired, remove from channel
-                        self.redis_client.srem(channel_key, username)
-                        cleaned_count += 1
+            # Prune members not seen within the TTL from every presence set
+            presence_keys = [key async for key in self.redis_client.scan_iter(match="presence:*", count=500)]
+            if presence_keys:
+                since = time.time_ns() // 1_000_000 - PRESENCE_TTL * 1000
+                pipe = self.redis_client.pipeline(transaction=False)
+                for presence_key in presence_keys:
+                    pipe.zremrangebyscore(presence_key, "-inf", f"({since}")
+                cleaned_count += sum(await pipe.execute())
             
             return cleaned_count
         except Exception as e:
-            print(f"Error cleaning up expired users: {e}")
+            logger.error("Error cleaning up expired users: %s", e)
             return 0
 
 
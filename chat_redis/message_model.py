@@ -1,13 +1,13 @@
 # Define the Message Structure
-from datetime import datetime # To timestamp messages with a standard format.
+import time # To timestamp messages with a standard format.
 
 def create_message(sender: str, content: str, channel: str):
     return {
         "sender": sender, # who sent the message
         "content": content, # the message text
         "channel": channel, # channel or room id the message belongs to (helps consumers route messages)
-        "timestamp": datetime.utcnow().isoformat() # the exact time message was created
+        "timestamp": time.time_ns() // 1_000_000 # the exact time message was created, in milliseconds since the Unix epoch
     }
 
-# using datetime.utcnow().isoformat() so all systems use UTC.
+# using epoch milliseconds so all systems agree on UTC and no date string has to be formatted or parsed.
 #This is the message format sent to Redis
\ No newline at end of file
@@ -1,5 +1,7 @@
 # Create Function to PUBLISH Chat Messages
-import json #Redis Pub/Sub transmits strings, so serialize message dict to JSON.
+import orjson #Redis Pub/Sub transmits strings/bytes, so serialize message dict to JSON (orjson is a fast C JSON library).
+from typing import Iterable, Tuple
+
 from .redis_client import redis_client
 
 #a function that other code (FastAPI) will call when a message should be broadcast.
@@ -7,13 +9,26 @@ def publish_message(channel: str, message: dict):
     """
     Publish a chat message to a given channel.
     """
-    redis_client.publish(channel, json.dumps(message)) # converts the Python message dict to a JSON string.
+    redis_client.publish(channel, orjson.dumps(message)) # converts the Python message dict to JSON bytes.
     """
-    json.dumps(message) is the payload
+    orjson.dumps(message) is the payload
     It takes your Python dict (the message)
-    Converts it into a JSON string
+    Converts it into UTF-8 JSON bytes (datetimes are written as ISO strings)
     Sends that string to Redis as the message body
     Any subscriber listening on that channel will receive it."""
 
     return True
- #FastAPI will call this function when a user sends a message.
\ No newline at end of file
+ #FastAPI will call this function when a user sends a message.
+
+
+def publish_many(items: Iterable[Tuple[str, dict]]):
+    """
+    Publish several chat messages, each to its own channel, in one round trip.
+    """
+    pipe = redis_client.pipeline(transaction=False) # queue the PUBLISH commands and send them together
+    for channel, message in items:
+        pipe.publish(channel, orjson.dumps(message))
+    pipe.execute()
+
+    return True
+ #Use this instead of calling publish_message in a loop, e.g. for per-room fan-out or system notifications.
@@ -1,14 +1,74 @@
 # connect python to redis 
 
+import socket
+
 import redis as redis_lib
+import redis.asyncio as redis_asyncio
+
+# TCP keepalive settings shared by every connection, so idle connections
+# (e.g. a quiet pub/sub subscription) aren't silently dropped by NATs or
+# firewalls. redis-py already sets TCP_NODELAY on its sockets.
+KEEPALIVE_OPTIONS = {}
+if hasattr(socket, "TCP_KEEPIDLE"):  # not available on every platform
+    KEEPALIVE_OPTIONS[socket.TCP_KEEPIDLE] = 60 # start probing after 60s idle
 
 # Initialize Redis client
-redis_client = redis_lib.Redis(
+redis_pool = redis_lib.ConnectionPool(
     host="localhost",# connect to Redis running on the same machine
     port=6379, # default is 6379
     db=0, #Redis supports multiple logical databases (numbered 0..N). 0 is the default.
-    decode_responses=True # automatically decode bytes to strings, saves you from calling .decode() everywhere.
+    decode_responses=True, # automatically decode bytes to strings, saves you from calling .decode() everywhere.
+    max_connections=128, # upper bound on open connections; each request handler borrows one per command
+    socket_timeout=5, # fail a command instead of hanging forever if Redis stops answering
+    socket_keepalive=True,
+    socket_keepalive_options=KEEPALIVE_OPTIONS
+)
+redis_client = redis_lib.Redis(connection_pool=redis_pool)
+
+# Same server, but replies stay as raw bytes. Used for stored JSON blobs
+# (users, groups, chat history) that msgspec decodes straight from bytes,
+# skipping a UTF-8 decode into str first.
+redis_bytes_client = redis_lib.Redis(
+    host="localhost",
+    port=6379,
+    db=0,
+    decode_responses=False,
+    max_connections=128,
+    socket_timeout=5,
+    socket_keepalive=True,
+    socket_keepalive_options=KEEPALIVE_OPTIONS
+)
+
+# Async client for pub/sub relaying inside the FastAPI event loop.
+# Responses stay as raw bytes so payloads can be forwarded to WebSockets untouched.
+# No socket_timeout here: subscriptions legitimately sit idle between messages.
+async_redis_client = redis_asyncio.Redis(
+    host="localhost",
+    port=6379,
+    db=0,
+    decode_responses=False,
+    socket_keepalive=True,
+    socket_keepalive_options=KEEPALIVE_OPTIONS
+)
+
+# Async client for services called from request handlers, so Redis I/O
+# yields to the event loop instead of blocking it. Replies are decoded to
+# strings like redis_client; connections come from a shared pool.
+# BlockingConnectionPool makes a burst beyond max_connections wait for a
+# free connection (up to timeout seconds) instead of failing with
+# "Too many connections".
+async_redis_pool = redis_asyncio.BlockingConnectionPool(
+    host="localhost",
+    port=6379,
+    db=0,
+    decode_responses=True,
+    max_connections=64,
+    timeout=5, # seconds a command waits for a free connection
+    socket_timeout=5,
+    socket_keepalive=True,
+    socket_keepalive_options=KEEPALIVE_OPTIONS
 )
+async_redis_str_client = redis_asyncio.Redis(connection_pool=async_redis_pool)
 
 def test_connection():
     try:
@@ -1,28 +1,100 @@
 #Create Function to SUBSCRIBE to Chat Channels
-import json #convert incoming JSON strings back into Python dicts.
-from .redis_client import redis_client
+import asyncio
+import orjson #convert incoming JSON payloads back into Python dicts (orjson is a fast C JSON library).
+from typing import Dict, List
+from .redis_client import async_redis_client
 
-# FastAPI will often iterate over this generator to forward messages to WebSocket clients.
-# Creates a PubSub object from the Redis client. This object manages subscriptions and listens for messages.
-pubsub = redis_client.pubsub()
-def subscribe_to_channel(channel: str): 
+# One pub/sub connection is shared by every subscribe_to_channel caller in the process.
+# A single reader task parses each message once and fans it out to the subscribers' queues.
+_pubsub = None
+_reader_task = None
+_subscribe_lock = asyncio.Lock() # SUBSCRIBE/UNSUBSCRIBE go out one at a time so they share one connection
+_channel_queues: Dict[str, List[asyncio.Queue]] = {} # channel -> one queue per subscriber
+
+MAX_BATCH_SIZE = 128 # most messages handed over per batch, so one batch can't monopolize the event loop
+
+
+async def _message_batches(pubsub, timeout: float = 1.0, max_batch: int = MAX_BATCH_SIZE):
+    """
+    Yield lists of published messages from a pub/sub connection until nothing is subscribed.
+    Waits up to timeout seconds for a message, then drains up to max_batch messages that have
+    already arrived without waiting again, so a burst is handled in a few passes instead of one
+    wakeup per message.
+    """
+    while pubsub.subscribed:
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None: # timed out (or a subscribe confirmation); check subscriptions again
+            continue
+
+        batch = [message]
+        while len(batch) < max_batch:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0)
+            if message is None:
+                break
+            batch.append(message)
+        yield batch
+
+        await asyncio.sleep(0) # draining buffered messages never suspends, so let other tasks (e.g. WebSocket writers) run between batches
+
+
+async def _read_messages():
     """
-    Subscribe to a Redis pub/sub channel.
+    Read the shared pub/sub connection and hand each message to that channel's subscribers.
+    Ends once no channels are subscribed; the next subscriber starts it again.
     """
-    pubsub = redis_client.pubsub() # Create a PubSub object from the Redis client. This object manages subscriptions and listens for messages.
-    pubsub.subscribe(channel) # Redis will start sending incoming messages to this PubSub.
+    async for batch in _message_batches(_pubsub):
+        for message in batch:
+            queues = _channel_queues.get(message['channel'].decode())
+            if queues:
+                data = orjson.loads(message['data']) # parsed once, shared by every subscriber
+                for queue in queues:
+                    queue.put_nowait(data)
 
-    for message in pubsub.listen(): # This is a blocking call that waits for new messages. Each message is itself a dict with keys like 'type', 'pattern', 'channel', and 'data'.
-        if message['type'] == 'message': # filters to only actual published messages.
-            yield json.loads(message['data'])
 
-            #message['data'] is the JSON string we published earlier. 
-            # json.loads(...) converts it back to a Python dict.
-            #  yield returns that dict to the caller while the generator stays open to receive more messages.
+# FastAPI iterates over these async generators to forward messages to WebSocket clients.
+async def subscribe_to_channel(channel: str):
+    """
+    Subscribe to a Redis pub/sub channel without blocking the event loop.
+    """
+    global _pubsub, _reader_task
+
+    queue = asyncio.Queue()
+    queues = _channel_queues.setdefault(channel, [])
+    queues.append(queue)
+    if _pubsub is None:
+        _pubsub = async_redis_client.pubsub()
+    if len(queues) == 1:
+        async with _subscribe_lock:
+            await _pubsub.subscribe(channel) # first local subscriber, so Redis starts sending this channel
+    if _reader_task is None or _reader_task.done():
+        _reader_task = asyncio.create_task(_read_messages())
+
+    try:
+        while True:
+            yield await queue.get()
+
+            # yield returns each message dict to the caller while the generator stays open to receive more messages.
+    finally:
+        queues.remove(queue)
+        if not queues: # last local subscriber left
+            del _channel_queues[channel]
+            async with _subscribe_lock:
+                await _pubsub.unsubscribe(channel)
 
- #FastAPI will use this to stream messages to frontend.
+ #FastAPI will use this to stream messages to frontend: async for message in subscribe_to_channel(channel)
+
+
+async def subscribe_to_pattern(*patterns: str):
+    """
+    Subscribe to every Redis pub/sub channel matching any of the patterns, without blocking the event loop.
+    All patterns share one connection. Yields (channel, data) pairs as raw bytes.
+    """
+    pubsub = async_redis_client.pubsub()
+    await pubsub.psubscribe(*patterns)
 
- # NOTE
-#  this subscriber is synchronous/blocking, it uses the blocking listen() iterator.
-#  That is fine if the FastAPI integration runs it in a background thread or process.
-#  If you prefer async/non-blocking behavior, you would use redis.asyncio and an async loop.
\ No newline at end of file
+    try:
+        async for batch in _message_batches(pubsub):
+            for message in batch:
+                yield message['channel'], message['data']
+    finally:
+        await pubsub.aclose()
@@ -12,6 +12,8 @@ document.addEventListener("DOMContentLoaded", () => {
   const API_BASE_URL = 'http://localhost:8000';
   const WS_URL = 'ws://localhost:8000/ws/chat';
   const CHANNEL = 'general';
+  const textDecoder = new TextDecoder();
+  const textEncoder = new TextEncoder();
   
   console.log('🚀 Chat app starting...');
   console.log('API Base URL:', API_BASE_URL);
@@ -64,6 +66,8 @@ document.addEventListener("DOMContentLoaded", () => {
     
     try {
       websocket = new WebSocket(wsUrl);
+      // Server sends UTF-8 JSON as binary frames
+      websocket.binaryType = 'arraybuffer';
       
       websocket.onopen = () => {
         console.log('✅ Connected to chat server');
@@ -75,7 +79,8 @@ document.addEventListener("DOMContentLoaded", () => {
       
       websocket.onmessage = (event) => {
         try {
-          const data = JSON.parse(event.data);
+          const raw = typeof event.data === 'string' ? event.data : textDecoder.decode(event.data);
+          const data = JSON.parse(raw);
           console.log('📨 Received message:', data);
           handleWebSocketMessage(data);
         } catch (error) {
@@ -456,7 +461,7 @@ document.addEventListener("DOMContentLoaded", () => {
         message_type: 'text'
       };
       
-      websocket.send(JSON.stringify(message));
+      websocket.send(textEncoder.encode(JSON.stringify(message)));
       msgInput.value = '';
       
       // Stop typing indicator
@@ -484,7 +489,7 @@ document.addEventListener("DOMContentLoaded", () => {
           message_type: 'image'
         };
         
-        websocket.send(JSON.stringify(message));
+        websocket.send(textEncoder.encode(JSON.stringify(message)));
       };
       reader.readAsDataURL(file);
       imageInput.value = '';
@@ -504,7 +509,7 @@ document.addEventListener("DOMContentLoaded", () => {
       channel: CHANNEL
     };
     
-    websocket.send(JSON.stringify(message));
+    websocket.send(textEncoder.encode(JSON.stringify(message)));
   }
   
   // Update typing status display
@@ -635,7 +640,7 @@ document.addEventListener("DOMContentLoaded", () => {
               message_type: 'audio'
             };
             
-            websocket.send(JSON.stringify(message));
+            websocket.send(textEncoder.encode(JSON.stringify(message)));
           };
           reader.readAsDataURL(blob);
           stream.getTracks().forEach(track => track.stop());